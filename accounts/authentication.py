@@ -0,0 +1,136 @@
+# accounts/authentication.py
+"""
+JWT authentication without a User query per request.
+
+simplejwt's JWTAuthentication loads the whole User row on every call.
+CachedJWTAuthentication instead takes the user ID from the signed token
+and looks the user up in a small in-process cache of User rows, filled by
+one query on a miss and kept for AUTH_USER_CACHE_TTL seconds. request.user
+is a complete User built from the cached row, so views that read email,
+last_login or the password hash need no further query. Because the row may
+be stale, it must not be written back: views that change the user load it
+from the database, and a full save() of a cached instance raises.
+
+Tokens issued by get_tokens_for_user carry username/is_staff/is_active
+claims for clients and a "pwd" stamp: a token minted before the password
+was last changed is rejected. Tokens from before the stamp existed are
+accepted until AUTH_PASSWORD_CLAIM_REQUIRED_AFTER and rejected from then
+on, as refresh token rotation would otherwise keep them alive for good.
+User saves drop the cached row in this process, so a deactivation or
+password change is seen at once here and within the TTL in other
+processes.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+PASSWORD_CLAIM = 'pwd'
+
+# the user's concrete field values by attname, and a stamp of the password hash
+UserState = namedtuple('UserState', ('row', 'password_stamp'))
+
+
+def password_stamp(password_hash):
+    """Short keyed digest of a password hash; changes whenever the password does."""
+    key_salt = 'accounts.authentication.password_stamp'
+    return salted_hmac(key_salt, password_hash or '', algorithm='sha256').hexdigest()[:16]
+
+
+def add_user_claims(token, user):
+    token['username'] = user.get_username()
+    token['is_staff'] = user.is_staff
+    token['is_active'] = user.is_active
+    token[PASSWORD_CLAIM] = password_stamp(user.password)
+    return token
+
+
+class UserStateCache:
+    """Per-process {user_id: UserState} with a short TTL."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+
+    def get(self, user_id):
+        """The user's state, or None if there is no such user."""
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry and entry[0] > now:
+            return entry[1]
+
+        names = [field.attname for field in get_user_model()._meta.concrete_fields]
+        values = get_user_model().objects.filter(pk=user_id).values_list(*names).first()
+        if values is None:
+            return None
+        row = dict(zip(names, values))
+        state = UserState(row, password_stamp(row['password']))
+        if self.ttl:
+            with self._lock:
+                limit = getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000)
+                while len(self._entries) >= limit:
+                    # evict the oldest entry
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[user_id] = (now + self.ttl, state)
+        return state
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_states = UserStateCache()
+
+
+def invalidate_user(user_id):
+    user_states.invalidate(user_id)
+    # and again once committed, in case a request re-cached the old row meanwhile
+    transaction.on_commit(lambda: user_states.invalidate(user_id))
+
+
+def password_claim_required():
+    """Whether tokens without a password stamp are refused by now."""
+    cutoff = getattr(settings, 'AUTH_PASSWORD_CLAIM_REQUIRED_AFTER', None)
+    return cutoff is not None and timezone.now() >= cutoff
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        state = user_states.get(user_id)
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not state.row['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        stamp = validated_token.get(PASSWORD_CLAIM)
+        if stamp is None and password_claim_required():
+            raise AuthenticationFailed(_("Token predates password checks; log in again."), code="password_claim_missing")
+        if stamp is not None and stamp != state.password_stamp:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        # a fresh instance per request from the cached row; nothing is deferred
+        user = get_user_model().from_db(DEFAULT_DB_ALIAS, list(state.row), list(state.row.values()))
+        # may be up to AUTH_USER_CACHE_TTL old, see accounts/signals.py
+        user._from_auth_cache = True
+        return user
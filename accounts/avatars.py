@@ -0,0 +1,117 @@
+# accounts/avatars.py
+"""
+Avatar uploads.
+
+An uploaded avatar is centre-cropped to a square and rendered once per
+AVATAR_SIZES entry (32/64/256 px by default). Variants are stored through
+the shared storage backend under content-addressed names
+(<sha256>_<size>.<ext>), so a URL never changes meaning and can be cached
+forever: uploads to Supabase carry an immutable Cache-Control, and with
+local storage the files are served by AvatarFileView with the same header
+and an ETag. Profile.avatar_url is the largest variant; lists and feeds
+should use the small ones from Profile.avatar_variants.
+"""
+import hashlib
+import io
+import logging
+import re
+
+from django.conf import settings
+from django.urls import reverse
+
+from core.storage import LocalStorage, StorageError, get_storage, sniff_image_type
+
+from .supabase_utils import SUPABASE_BUCKET
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    logger.warning("Pillow not installed. Avatar uploads will be disabled.")
+    PIL_AVAILABLE = False
+
+ALLOWED_TYPES = ('image/jpeg', 'image/png', 'image/webp')
+MAX_SIZE = 2 * 1024 * 1024
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+FILE_NAME = re.compile(r'^[0-9a-f]{64}_\d+\.(jpg|png)$')
+
+
+def avatar_sizes():
+    return getattr(settings, 'AVATAR_SIZES', (32, 64, 256))
+
+
+def validate(file_obj):
+    """Raise ValueError unless file_obj is a supported image under MAX_SIZE."""
+    if file_obj.size > MAX_SIZE:
+        raise ValueError("File too large. Max 2MB.")
+    if sniff_image_type(file_obj) not in ALLOWED_TYPES:
+        raise ValueError("Unsupported image type. Allowed: jpeg, png, webp")
+
+
+def public_url(name):
+    storage = get_storage()
+    if isinstance(storage, LocalStorage):
+        return reverse('accounts:avatar-file', kwargs={'name': name})
+    return storage.public_url(SUPABASE_BUCKET, name)
+
+
+def render(file_obj):
+    """Yield (size, fmt, bytes) for each avatar size."""
+    with Image.open(file_obj) as source:
+        source = ImageOps.exif_transpose(source)
+        has_alpha = source.mode in ('RGBA', 'LA') or (
+            source.mode == 'P' and 'transparency' in source.info
+        )
+        source = source.convert('RGBA' if has_alpha else 'RGB')
+    for size in avatar_sizes():
+        image = ImageOps.fit(source, (size, size), Image.LANCZOS)
+        image.info = {}
+        buffer = io.BytesIO()
+        if has_alpha:
+            image.save(buffer, 'PNG', optimize=True)
+            yield size, 'png', buffer.getvalue()
+        else:
+            image.save(buffer, 'JPEG', quality=90, optimize=True)
+            yield size, 'jpg', buffer.getvalue()
+
+
+def save_avatar(profile, file_obj):
+    """Render, store and attach an avatar. Raises ValueError or StorageError."""
+    if not PIL_AVAILABLE:
+        raise StorageError('Avatar processing is unavailable')
+    validate(file_obj)
+    digest = hashlib.sha256()
+    for chunk in file_obj.chunks():
+        digest.update(chunk)
+    digest = digest.hexdigest()
+    file_obj.seek(0)
+
+    storage = get_storage()
+    variants = {}
+    for size, fmt, content in render(file_obj):
+        name = f"{digest}_{size}.{fmt}"
+        storage.upload(SUPABASE_BUCKET, name, content, f'image/{"jpeg" if fmt == "jpg" else fmt}',
+                       upsert=True, cache_control=CACHE_CONTROL)
+        variants[str(size)] = public_url(name)
+
+    profile.avatar_variants = variants
+    profile.avatar_url = variants[str(max(avatar_sizes()))]
+    profile.save(update_fields=['avatar_variants', 'avatar_url', 'updated_at'])
+    return profile
+
+
+def remove_avatar(profile):
+    # variants are content-addressed and may be shared, so objects are kept
+    profile.avatar_variants = {}
+    profile.avatar_url = None
+    profile.save(update_fields=['avatar_variants', 'avatar_url', 'updated_at'])
+    return profile
+
+
+def small_avatar(profile, size=64):
+    """URL of a small avatar for embedding in lists and feeds."""
+    if profile is None:
+        return None
+    return profile.avatar_variants.get(str(size)) or profile.avatar_url
@@ -0,0 +1,39 @@
+# accounts/counters.py
+"""
+Denormalized follower/following/post counters on Profile.
+
+adjust() is called from the Follow and Post signal handlers and applies an
+in-database F() update, so it runs in the same transaction as the row
+change that caused it. rebuild_profile_counts() recomputes every profile.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Profile
+
+COUNTER_FIELDS = ('followers_count', 'following_count', 'posts_count')
+
+
+def adjust(user_id, field, delta):
+    if field not in COUNTER_FIELDS:
+        raise ValueError(f"Unknown counter field: {field}")
+    Profile.objects.filter(user_id=user_id).update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+def _count(queryset, group_field):
+    return Subquery(
+        queryset.filter(**{group_field: OuterRef('user_id')})
+        .order_by().values(group_field).annotate(c=Count('id')).values('c')
+    )
+
+
+def rebuild_profile_counts():
+    """Recompute all profile counters in one UPDATE. Returns the rows touched."""
+    from posts.models import Post
+    from social.models import Follow
+
+    return Profile.objects.update(
+        followers_count=Coalesce(_count(Follow.objects.all(), 'following_id'), 0),
+        following_count=Coalesce(_count(Follow.objects.all(), 'follower_id'), 0),
+        posts_count=Coalesce(_count(Post.objects.filter(is_active=True), 'author_id'), 0),
+    )
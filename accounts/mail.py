@@ -0,0 +1,95 @@
+# accounts/mail.py
+"""
+Transactional email outbox.
+
+queue_email() stores the message in the caller's transaction and returns;
+nothing talks to SMTP on the request path. A background sender wakes every
+EMAIL_OUTBOX_INTERVAL seconds (0 leaves it to the send_queued_email
+command), claims a batch so no other process sends the same rows, opens
+one connection through EMAIL_OUTBOX_BACKEND (default EMAIL_BACKEND) for
+the whole batch, deletes delivered rows and retries the rest with
+exponential backoff, parking them after EMAIL_OUTBOX_MAX_ATTEMPTS.
+Point EMAIL_OUTBOX_BACKEND at the file or locmem backend, or EMAIL_HOST at
+a local SMTP stand-in, to exercise it without a real mail server.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+
+from core.workers import PeriodicWorker, claim_batch, defer_batch
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, body, recipients, from_email=None):
+    """Queue a plain-text email; it is sent after the current transaction commits."""
+    row = EmailOutbox.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(recipients),
+    )
+    transaction.on_commit(sender.ensure_running)
+    return row
+
+
+def backoff(attempts):
+    base = getattr(settings, 'EMAIL_OUTBOX_BACKOFF', 30)
+    cap = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_MAX', 3600)
+    return timedelta(seconds=min(cap, base * 2 ** (attempts - 1)))
+
+
+def _defer(rows, error):
+    defer_batch(rows, error, backoff, getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 8))
+
+
+def send_once(batch_size=None):
+    """Claim and send one batch of due emails over a single connection. Returns (sent, failed)."""
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+    rows = claim_batch(EmailOutbox.objects.all(), batch_size)
+    if not rows:
+        return 0, 0
+
+    connection = get_connection(getattr(settings, 'EMAIL_OUTBOX_BACKEND', None))
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning(f"Email backend unavailable, deferring {len(rows)} messages: {e}")
+        _defer(rows, e)
+        return 0, len(rows)
+
+    sent, failed = [], []
+    try:
+        for row in rows:
+            message = EmailMessage(row.subject, row.body, row.from_email, row.to, connection=connection)
+            try:
+                message.send(fail_silently=False)
+                sent.append(row.id)
+            except Exception as e:
+                logger.warning(f"Sending email {row.id} failed (attempt {row.attempts + 1}): {e}")
+                _defer([row], e)
+                failed.append(row.id)
+    finally:
+        connection.close()
+
+    EmailOutbox.objects.filter(id__in=sent).delete()
+    return len(sent), len(failed)
+
+
+def send_queued(batch_size=None):
+    """Send batches until nothing is due or a whole batch fails. Returns the number sent."""
+    total = 0
+    while True:
+        sent, failed = send_once(batch_size)
+        total += sent
+        if not sent:
+            return total
+
+
+# 0 leaves sending to the send_queued_email command
+sender = PeriodicWorker('email-outbox', send_queued, 'EMAIL_OUTBOX_INTERVAL', 2.0)
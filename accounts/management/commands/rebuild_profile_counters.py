@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts.counters import rebuild_profile_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute Profile follower, following and post counters"
+
+    def handle(self, *args, **options):
+        updated = rebuild_profile_counts()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt counters on {updated} profiles"))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import mail
+
+
+class Command(BaseCommand):
+    help = "Send queued transactional email from the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep sending until interrupted')
+        parser.add_argument('--interval', type=float, default=2.0)
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        while True:
+            sent = mail.send_queued(options['batch_size'])
+            if sent:
+                self.stdout.write(f"Sent {sent} emails")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
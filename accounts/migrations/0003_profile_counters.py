@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Profile = apps.get_model('accounts', 'Profile')
+    Follow = apps.get_model('social', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+
+    def count(queryset, field):
+        return Coalesce(Subquery(
+            queryset.filter(**{field: OuterRef('user_id')})
+            .order_by().values(field).annotate(c=Count('id')).values('c')
+        ), 0)
+
+    Profile.objects.update(
+        followers_count=count(Follow.objects.all(), 'following_id'),
+        following_count=count(Follow.objects.all(), 'follower_id'),
+        posts_count=count(Post.objects.filter(is_active=True), 'author_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_followers_profile'),
+        ('posts', '0004_post_posts_created_id_idx'),
+        ('social', '0004_comment_social_comment_post_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
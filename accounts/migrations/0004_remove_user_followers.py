@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_profile_counters'),
+        # edges are copied into social.Follow before the M2M table goes away
+        ('social', '0005_unify_follow_graph'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='followers',
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:39
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# A copy of accounts.search.user_grams as of this migration, so later changes
+# to the live index do not change what this migration writes; the
+# rebuild_user_search_index command brings an index up to date.
+WORD = re.compile(r'[^\W_]+')
+FIELD_WEIGHTS = {'username': 3, 'first_name': 2, 'last_name': 2, 'email': 1}
+PREFIX_BONUS = 2
+
+
+def user_grams(user):
+    grams = {}
+    for field, field_weight in FIELD_WEIGHTS.items():
+        value = getattr(user, field, '') or ''
+        if field == 'email':
+            value = value.split('@', 1)[0]
+        for word in WORD.findall(value.casefold()):
+            padded = f'  {word}'
+            for i in range(len(padded) - 2):
+                gram, weight = padded[i:i + 3], field_weight + (PREFIX_BONUS if i < 2 else 0)
+                grams[gram] = max(grams.get(gram, 0), weight)
+    return grams
+
+
+def build_index(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    UserSearchGram = apps.get_model('accounts', 'UserSearchGram')
+    rows = []
+    for user in User.objects.iterator():
+        rows.extend(
+            UserSearchGram(user_id=user.id, gram=gram, weight=weight)
+            for gram, weight in user_grams(user).items()
+        )
+    UserSearchGram.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_grams', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('gram', 'user')},
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
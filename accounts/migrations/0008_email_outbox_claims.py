@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def park_exhausted(apps, schema_editor):
+    EmailOutbox = apps.get_model('accounts', 'EmailOutbox')
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 8)
+    EmailOutbox.objects.filter(attempts__gte=max_attempts).update(status='parked')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_user_search_gram'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='emailoutbox',
+            name='accounts_email_due_idx',
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('parked', 'Parked')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(fields=['status', 'next_attempt_at', 'id'], name='accounts_email_due_idx'),
+        ),
+        migrations.RunPython(park_exhausted, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,9 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import RegexValidator
 from django.conf import settings
+from django.utils import timezone
+
+from core.workers import OUTBOX_PENDING, OUTBOX_STATUS_CHOICES
 
 username_validator = RegexValidator(
     regex=r'^[A-Za-z0-9_]{3,30}$',
@@ -18,13 +21,8 @@ class User(AbstractUser):
     )
     is_email_verified = models.BooleanField(default=False)
 
-    # followers: users who follow this user
-    followers = models.ManyToManyField(
-        'self',
-        symmetrical=False,
-        related_name='following',
-        blank=True
-    )
+    # follow edges live in social.models.Follow
+    # (follower.following_set / following.followers_set)
 
     REQUIRED_FIELDS = ['email']
 
@@ -44,10 +42,62 @@ class Profile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='profile')
     bio = models.CharField(max_length=160, blank=True)
     avatar_url = models.URLField(blank=True, null=True)
+    # {"32": url, "64": url, "256": url}, see accounts/avatars.py
+    avatar_variants = models.JSONField(default=dict, blank=True)
     website = models.URLField(blank=True, null=True)
     location = models.CharField(max_length=120, blank=True, null=True)
     visibility = models.CharField(max_length=20, choices=VISIBILITY_CHOICES, default=VISIBILITY_PUBLIC)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # denormalized, kept in step by social/signals.py (see accounts/counters.py)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"Profile {self.user.username}"
+
+
+class EmailOutbox(models.Model):
+    """
+    Transactional email waiting to be sent. Rows are written in the request's
+    transaction, leased to one sender at a time and deleted once delivered;
+    rows that run out of attempts are parked. See accounts/mail.py.
+    """
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=10, choices=OUTBOX_STATUS_CHOICES, default=OUTBOX_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # lease token of the sender currently holding the row (core/workers.py)
+    claimed_by = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at', 'id'], name='accounts_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
+
+
+class UserSearchGram(models.Model):
+    """
+    Trigram index over user names for ranked, typo-tolerant search. Rows are
+    rebuilt from accounts/signals.py when a user's names change; see
+    accounts/search.py.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='search_grams')
+    gram = models.CharField(max_length=3)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        # leads with gram: a search is a range read per query trigram
+        unique_together = ('gram', 'user')
+
+    def __str__(self):
+        return f"{self.gram!r} -> {self.user_id}"
@@ -0,0 +1,106 @@
+# accounts/search.py
+"""
+Trigram search over usernames and names.
+
+Each user's username, first/last name and email local part are split into
+lowercase words and indexed as trigrams in UserSearchGram, with words
+padded on the left so their first grams ("  j", " jo") mark prefixes. A
+query is turned into grams the same way and answered with one indexed
+join: users sharing at least USER_SEARCH_MIN_SIMILARITY of the query's
+grams match, ranked by the summed weight of the grams they share. Prefix
+grams and username grams weigh more, so "jo" finds "john" and "joanna" but
+not "major", and a typo such as "jonh" still shares half its grams with
+"john". An exact username match always comes first; equal scores go to
+usernames starting with the query, then to the username closest to it in
+length, so "jonh" ranks "john" above "joanna".
+"""
+import math
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, Sum, Value, When
+from django.db.models.functions import Abs, Length
+
+from .models import UserSearchGram
+
+INDEXED_FIELDS = ('username', 'first_name', 'last_name', 'email')
+FIELD_WEIGHTS = {'username': 3, 'first_name': 2, 'last_name': 2, 'email': 1}
+PREFIX_BONUS = 2
+
+WORD = re.compile(r'[^\W_]+')
+
+
+def words(text):
+    return WORD.findall((text or '').casefold())
+
+
+def word_grams(word):
+    """Left-padded trigrams of a word, with a flag for the two prefix grams."""
+    padded = f'  {word}'
+    return [(padded[i:i + 3], i < 2) for i in range(len(padded) - 2)]
+
+
+def user_grams(user):
+    """{gram: weight} for a user."""
+    grams = {}
+    for field in INDEXED_FIELDS:
+        value = getattr(user, field, '') or ''
+        if field == 'email':
+            value = value.split('@', 1)[0]
+        for word in words(value):
+            for gram, is_prefix in word_grams(word):
+                weight = FIELD_WEIGHTS[field] + (PREFIX_BONUS if is_prefix else 0)
+                grams[gram] = max(grams.get(gram, 0), weight)
+    return grams
+
+
+def query_grams(query):
+    return {gram for word in words(query) for gram, _ in word_grams(word)}
+
+
+def index_user(user):
+    """Bring the user's index rows in line with their current fields."""
+    wanted = user_grams(user)
+    with transaction.atomic():
+        current = dict(UserSearchGram.objects.filter(user=user).values_list('gram', 'weight'))
+        stale = [gram for gram, weight in current.items() if wanted.get(gram) != weight]
+        if stale:
+            UserSearchGram.objects.filter(user=user, gram__in=stale).delete()
+        UserSearchGram.objects.bulk_create([
+            UserSearchGram(user=user, gram=gram, weight=weight)
+            for gram, weight in wanted.items() if current.get(gram) != weight
+        ])
+
+
+def rebuild_index(users, batch_size=500):
+    """Reindex every user in `users`. Returns the number indexed."""
+    count = 0
+    for user in users.iterator(chunk_size=batch_size):
+        index_user(user)
+        count += 1
+    return count
+
+
+def search(queryset, query):
+    """Filter a User queryset to matches for `query`, best first."""
+    grams = query_grams(query)
+    if not grams:
+        return queryset.none()
+    similarity = getattr(settings, 'USER_SEARCH_MIN_SIMILARITY', 0.5)
+    needed = max(1, math.ceil(len(grams) * similarity))
+    query = query.strip()
+    return (
+        queryset.filter(search_grams__gram__in=grams)
+        .annotate(
+            search_score=Sum('search_grams__weight'),
+            search_hits=Count('search_grams'),
+            search_exact=Case(When(username__iexact=query, then=Value(1)), default=Value(0)),
+            search_prefix=Case(When(username__istartswith=query, then=Value(1)), default=Value(0)),
+            search_length_gap=Abs(Length('username') - len(query)),
+        )
+        .filter(search_hits__gte=needed)
+        .order_by(
+            '-search_exact', '-search_score', '-search_prefix', 'search_length_gap', '-date_joined', '-id',
+        )
+    )
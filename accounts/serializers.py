@@ -5,6 +5,7 @@ from rest_framework import serializers
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import smart_bytes
 from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import add_user_claims
 from .models import Profile
 from posts.models import Post  # assume posts app has Post model
 
@@ -19,7 +20,8 @@ User = get_user_model()
 
 # Generate JWT tokens for user
 def get_tokens_for_user(user):
-    refresh = RefreshToken.for_user(user)
+    # claims are copied into every access token minted from this refresh token
+    refresh = add_user_claims(RefreshToken.for_user(user), user)
     return {
         'refresh': str(refresh),
         'access': str(refresh.access_token),
@@ -105,31 +107,21 @@ class ChangePasswordSerializer(serializers.Serializer):
 class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
-        fields = ('bio', 'avatar_url', 'website', 'location', 'visibility', 'updated_at')
+        fields = ('bio', 'avatar_url', 'avatar_variants', 'website', 'location', 'visibility', 'updated_at')
+        read_only_fields = ('avatar_variants',)
 
 class UserListSerializer(serializers.ModelSerializer):
     profile = ProfileSerializer(read_only=True)
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
-    posts_count = serializers.SerializerMethodField()
+    # denormalized on Profile; callers select_related('profile')
+    followers_count = serializers.IntegerField(source='profile.followers_count', read_only=True)
+    following_count = serializers.IntegerField(source='profile.following_count', read_only=True)
+    posts_count = serializers.IntegerField(source='profile.posts_count', read_only=True)
 
     class Meta:
         model = User
         fields = ('id', 'username', 'first_name', 'last_name', 'profile',
                   'followers_count', 'following_count', 'posts_count')
 
-    def get_followers_count(self, obj):
-        return obj.followers.count()
-
-    def get_following_count(self, obj):
-        return obj.following.count()
-
-    def get_posts_count(self, obj):
-        # posts app: Post model with ForeignKey author
-        if Post:
-            return Post.objects.filter(author=obj).count()
-        return 0
-
 class UserDetailSerializer(UserListSerializer):
     email = serializers.EmailField(read_only=True)
     is_email_verified = serializers.BooleanField(read_only=True)
@@ -142,7 +134,8 @@ class UserDetailSerializer(UserListSerializer):
         # Only include following list if this is the current user's profile
         request = self.context.get('request')
         if request and request.user == obj:
-            return UserListSerializer(obj.following.all(), many=True, context=self.context).data
+            following = User.objects.filter(followers_set__follower=obj).select_related('profile')
+            return UserListSerializer(following, many=True, context=self.context).data
         return None
 
 class UpdateOwnProfileSerializer(serializers.ModelSerializer):
@@ -157,13 +150,14 @@ class UpdateOwnProfileSerializer(serializers.ModelSerializer):
         instance.first_name = validated_data.get('first_name', instance.first_name)
         instance.last_name = validated_data.get('last_name', instance.last_name)
         profile_data = validated_data.get('profile', {})
-        instance.save()
+        # only the columns this form edits: the rest of the row may be stale
+        instance.save(update_fields=['first_name', 'last_name'])
 
         # update profile fields
         profile = instance.profile
         for attr, value in profile_data.items():
             setattr(profile, attr, value)
-        profile.save()
+        profile.save(update_fields=[*profile_data, 'updated_at'])
         return instance
     
 
@@ -1,12 +1,22 @@
 # accounts/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.conf import settings
 from .models import Profile
+from . import search
+from .authentication import invalidate_user
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+@receiver(pre_save, sender=User)
+def refuse_cached_user_save(sender, instance, update_fields=None, **kwargs):
+    # A User from the auth cache can be a minute old; saving all of it
+    # could reactivate a deactivated user or restore an old password.
+    if getattr(instance, '_from_auth_cache', False) and update_fields is None:
+        raise RuntimeError("Refusing a full save of a cached user; reload it or pass update_fields")
+
+
 @receiver(post_save, sender=User)
 def create_or_update_user_profile(sender, instance, created, **kwargs):
     if created:
@@ -14,3 +24,18 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
     else:
         # ensure profile exists
         Profile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def index_user_for_search(sender, instance, update_fields=None, **kwargs):
+    # e.g. update_last_login saves only last_login
+    if update_fields is not None and not set(update_fields) & set(search.INDEXED_FIELDS):
+        return
+    search.index_user(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_auth_cache(sender, instance, **kwargs):
+    # covers deactivation, password changes and staff changes
+    invalidate_user(instance.pk)
@@ -1,3 +1,251 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from array import array
 
-# Create your tests here.
+from django.core import mail as django_mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+from PIL import Image
+
+from core import storage
+from social import follow_cache
+from social.models import Follow
+
+from . import avatars, mail, search
+from .authentication import CachedJWTAuthentication, user_states
+from .models import EmailOutbox, Profile
+from .serializers import get_tokens_for_user
+from .utils import can_view_profile
+
+
+class CountingBackend(LocmemBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+
+class BrokenBackend(BaseEmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionRefusedError('SMTP stand-in is down')
+
+
+@override_settings(EMAIL_OUTBOX_INTERVAL=0, EMAIL_OUTBOX_BACKEND='accounts.tests.CountingBackend')
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        CountingBackend.opened = 0
+
+    def test_registration_queues_instead_of_sending(self):
+        response = APIClient().post('/api/auth/register/', {
+            'email': 'new@example.com', 'username': 'newbie', 'password': 'a-Strong-passw0rd',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(django_mail.outbox), 0)
+        self.assertEqual(EmailOutbox.objects.get().to, ['new@example.com'])
+
+    def test_batch_shares_one_connection(self):
+        for i in range(3):
+            mail.queue_email(f'Hello {i}', 'body', [f'user{i}@example.com'])
+
+        self.assertEqual(mail.send_queued(), 3)
+
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual([m.subject for m in django_mail.outbox], ['Hello 0', 'Hello 1', 'Hello 2'])
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    @override_settings(EMAIL_OUTBOX_BACKEND='accounts.tests.BrokenBackend')
+    def test_failures_back_off(self):
+        mail.queue_email('Hello', 'body', ['user@example.com'])
+
+        with self.assertLogs('accounts.mail', 'WARNING'):
+            self.assertEqual(mail.send_queued(), 0)
+
+        row = EmailOutbox.objects.get()
+        self.assertEqual(row.attempts, 1)
+        self.assertIn('stand-in is down', row.last_error)
+        # not retried before the backoff expires
+        with override_settings(EMAIL_OUTBOX_BACKEND='accounts.tests.CountingBackend'):
+            self.assertEqual(mail.send_queued(), 0)
+        self.assertEqual(len(django_mail.outbox), 0)
+
+
+class ProfileVisibilityTests(TestCase):
+    def test_followers_only_check_ignores_stale_follow_cache(self):
+        User = get_user_model()
+        alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+        Profile.objects.filter(user=bob).update(visibility=Profile.VISIBILITY_FOLLOWERS)
+        bob.refresh_from_db()
+        self.addCleanup(cache.clear)
+
+        Follow.objects.create(follower=alice, following=bob)
+        # as another process would still see it
+        cache.set(follow_cache._key(alice.id), b'')
+        self.assertTrue(can_view_profile(alice, bob))
+
+        Follow.objects.filter(follower=alice).delete()
+        cache.set(follow_cache._key(alice.id), array('q', [bob.id]).tobytes())
+        self.assertFalse(can_view_profile(alice, bob))
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('alice', 'alice@example.com', 'pw')
+        user_states.clear()
+        self.addCleanup(user_states.clear)
+        self.auth = CachedJWTAuthentication()
+
+    def test_cached_user_is_complete(self):
+        token = AccessToken(get_tokens_for_user(self.user)['access'])
+        self.auth.get_user(token)
+
+        with self.assertNumQueries(0):
+            user = self.auth.get_user(token)
+            self.assertEqual((user.email, user.is_email_verified), ('alice@example.com', False))
+            self.assertTrue(user.check_password('pw'))
+
+    def test_stampless_token_refused_after_cutoff(self):
+        token = AccessToken.for_user(self.user)
+
+        with self.settings(AUTH_PASSWORD_CLAIM_REQUIRED_AFTER=timezone.now() + timedelta(days=1)):
+            self.assertEqual(self.auth.get_user(token).pk, self.user.pk)
+        with self.settings(AUTH_PASSWORD_CLAIM_REQUIRED_AFTER=timezone.now() - timedelta(days=1)):
+            with self.assertRaises(AuthenticationFailed):
+                self.auth.get_user(token)
+        with self.settings(AUTH_PASSWORD_CLAIM_REQUIRED_AFTER=None):
+            self.assertEqual(self.auth.get_user(token).pk, self.user.pk)
+
+    def test_password_change_revokes_tokens(self):
+        token = AccessToken(get_tokens_for_user(self.user)['access'])
+        self.user.set_password('new')
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(token)
+
+    def test_profile_edit_keeps_newer_row(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(self.user)['access']}")
+        self.assertEqual(client.get('/api/auth/users/me/').status_code, 200)
+
+        # deactivated behind the cache's back, as a queryset update would
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False, last_name='Old')
+        response = client.patch('/api/auth/users/me/', {'first_name': 'Alice'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.first_name, self.user.is_active), ('Alice', False))
+
+    def test_cached_user_is_never_saved_whole(self):
+        token = AccessToken(get_tokens_for_user(self.user)['access'])
+        with self.assertRaises(RuntimeError):
+            self.auth.get_user(token).save()
+
+
+class UserSearchTests(TestCase):
+    def setUp(self):
+        for i, username in enumerate(('john', 'major', 'joanna', 'jon')):
+            get_user_model().objects.create_user(username, f'u{i}@example.com', 'pw')
+
+    def usernames(self, query):
+        return list(search.search(get_user_model().objects.all(), query).values_list('username', flat=True))
+
+    def test_prefix_matches_but_not_infix(self):
+        self.assertEqual(self.usernames('jo'), ['jon', 'john', 'joanna'])
+
+    def test_typo_prefers_closest_username(self):
+        # joanna joined later and shares as many grams with "jonh" as john
+        ranked = self.usernames('jonh')
+        self.assertLess(ranked.index('john'), ranked.index('joanna'))
+
+    def test_exact_username_first(self):
+        self.assertEqual(self.usernames('JON')[0], 'jon')
+
+    def test_renamed_user_is_reindexed(self):
+        user = get_user_model().objects.get(username='major')
+        user.username = 'joseph'
+        user.save(update_fields=['username'])
+        self.assertIn('joseph', self.usernames('jos'))
+        self.assertEqual(self.usernames('major'), [])
+
+    def test_query_without_words_matches_nothing(self):
+        self.assertEqual(self.usernames(' _!? '), [])
+
+
+class AvatarUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, True)
+        override = override_settings(MEDIA_ROOT=media, STORAGE_BACKEND='core.storage.LocalStorage')
+        override.enable()
+        self.addCleanup(override.disable)
+        storage.reset()
+        self.addCleanup(storage.reset)
+        self.user = get_user_model().objects.create_user('alice', 'alice@example.com', 'pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, content=None):
+        if content is None:
+            buffer = io.BytesIO()
+            Image.new('RGB', (500, 300), 'green').save(buffer, 'PNG')
+            content = buffer.getvalue()
+        avatar = SimpleUploadedFile('me.png', content, content_type='image/png')
+        return self.client.post('/api/auth/users/me/avatar/', {'avatar': avatar}, format='multipart')
+
+    def fetch(self, url, **headers):
+        response = APIClient().get(url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_upload_renders_square_variants(self):
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 200)
+        variants = response.data['avatar_variants']
+        self.assertEqual(sorted(variants, key=int), ['32', '64', '256'])
+        self.assertEqual(response.data['avatar_url'], variants['256'])
+        for size, url in variants.items():
+            _, body = self.fetch(url)
+            with Image.open(io.BytesIO(body)) as image:
+                self.assertEqual(image.size, (int(size), int(size)))
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(avatars.small_avatar(profile), variants['64'])
+        self.assertEqual(avatars.small_avatar(profile, size=32), variants['32'])
+
+    def test_files_are_immutable_with_etags(self):
+        url = self.upload().data['avatar_variants']['64']
+
+        response, _ = self.fetch(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], avatars.CACHE_CONTROL)
+        response, _ = self.fetch(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response, _ = self.fetch('/api/auth/avatars/..%2F..%2Fsettings.py')
+        self.assertEqual(response.status_code, 404)
+
+    def test_non_image_is_refused(self):
+        response = self.upload(b'GIF89a not allowed')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Profile.objects.get(user=self.user).avatar_variants, {})
+
+    def test_remove(self):
+        self.upload()
+        self.assertEqual(self.client.delete('/api/auth/users/me/avatar/').status_code, 204)
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual((profile.avatar_url, profile.avatar_variants), (None, {}))
+        self.assertIsNone(avatars.small_avatar(profile))
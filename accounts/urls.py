@@ -4,7 +4,8 @@ from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     RegisterView, VerifyEmailView, LoginView, LogoutView,
     PasswordResetView, PasswordResetConfirmView, ChangePasswordView,
-    UserListView, UserDetailView, MeProfileView, FollowUserView
+    UserListView, UserDetailView, MeProfileView, FollowUserView,
+    AvatarUploadView, AvatarFileView
 )
 
 app_name = 'accounts'
@@ -23,6 +24,8 @@ urlpatterns = [
     # User endpoints
     path('users/', UserListView.as_view(), name='user-list'),
     path('users/me/', MeProfileView.as_view(), name='user-me'),
+    path('users/me/avatar/', AvatarUploadView.as_view(), name='user-avatar'),
+    path('avatars/<str:name>', AvatarFileView.as_view(), name='avatar-file'),
     path('users/<int:id>/', UserDetailView.as_view(), name='user-detail'),
     path('users/<int:id>/follow/', FollowUserView.as_view(), name='user-follow'),
 ]
\ No newline at end of file
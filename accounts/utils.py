@@ -1,4 +1,7 @@
 # accounts/utils.py
+from social.models import Follow
+
+
 def can_view_profile(request_user, target_user):
     # owner and admin can always view
     if not request_user:
@@ -15,5 +18,5 @@ def can_view_profile(request_user, target_user):
         return False
     if visibility == target_user.profile.VISIBILITY_FOLLOWERS:
         # viewer must be in followers of target_user
-        return request_user and request_user in target_user.followers.all()
+        return bool(request_user) and Follow.objects.filter(follower=request_user, following=target_user).exists()
     return False
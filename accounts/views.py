@@ -4,7 +4,6 @@ from django.contrib.auth.models import update_last_login
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_str, smart_bytes
-from django.core.mail import send_mail
 from django.urls import reverse
 from django.conf import settings
 from rest_framework import generics, permissions, status
@@ -12,12 +11,13 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from .tokens import email_verification_token
+from .mail import queue_email
 from .serializers import (
     RegisterSerializer, EmailVerificationSerializer, LoginSerializer,
     ResetPasswordEmailRequestSerializer, SetNewPasswordSerializer,
     ChangePasswordSerializer, get_tokens_for_user
 )
-from rest_framework import generics, permissions, filters, status
+from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
@@ -26,6 +26,15 @@ from .permissions import IsOwnerOrAdmin
 from .utils import can_view_profile
 from .models import Profile
 from django.db.models import Q
+from social.models import Follow
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from rest_framework.parsers import FormParser, MultiPartParser
+from core.storage import LocalStorage, StorageError, get_storage
+from . import avatars, search
+from .serializers import ProfileSerializer
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 User = get_user_model()
@@ -58,13 +67,8 @@ Best regards,
 SocialConnect Team
         """
 
-        send_mail(
-            'Verify your SocialConnect email',
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False
-        )
+        # sent by the background email sender (accounts/mail.py)
+        queue_email('Verify your SocialConnect email', message, [user.email])
 
 class VerifyEmailView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -155,13 +159,7 @@ Best regards,
 SocialConnect Team
             """
             
-            send_mail(
-                'Password Reset Request - SocialConnect',
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-                fail_silently=False
-            )
+            queue_email('Password Reset Request - SocialConnect', message, [user.email])
         
         # Always return success message for security
         return Response({'detail': 'If the email exists, reset instructions have been sent'})
@@ -202,11 +200,13 @@ class ChangePasswordView(APIView):
         old_password = serializer.validated_data['old_password']
         new_password = serializer.validated_data['new_password']
 
-        if not request.user.check_password(old_password):
+        # the stored hash, not the one cached for authentication
+        user = User.objects.get(pk=request.user.pk)
+        if not user.check_password(old_password):
             return Response({'detail': 'Old password incorrect'}, status=status.HTTP_400_BAD_REQUEST)
 
-        request.user.set_password(new_password)
-        request.user.save()
+        user.set_password(new_password)
+        user.save(update_fields=['password'])
         return Response({'detail': 'Password changed successfully'})
 
 
@@ -216,11 +216,10 @@ class ChangePasswordView(APIView):
 class UserListView(generics.ListAPIView):
     serializer_class = UserListSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['username', 'first_name', 'last_name', 'email']
 
     def get_queryset(self):
-        q = self.request.query_params.get('q')
+        # ?search= is what the old SearchFilter read
+        q = self.request.query_params.get('q') or self.request.query_params.get('search')
         qs = User.objects.all().select_related('profile')
 
         # For non-authenticated users → only public profiles
@@ -229,21 +228,16 @@ class UserListView(generics.ListAPIView):
 
         # For regular authenticated users → public + followed + own profile
         elif not self.request.user.is_staff:
-            following_ids = self.request.user.following.values_list('id', flat=True)
+            following_ids = Follow.objects.filter(follower=self.request.user).values('following_id')
             qs = qs.filter(
                 Q(profile__visibility=Profile.VISIBILITY_PUBLIC) |
                 Q(profile__visibility=Profile.VISIBILITY_FOLLOWERS, id__in=following_ids) |
                 Q(id=self.request.user.id)
             )
 
-        # Apply search query if present
+        # Ranked trigram search over the index (accounts/search.py)
         if q:
-            qs = qs.filter(
-                Q(username__icontains=q) |
-                Q(first_name__icontains=q) |
-                Q(last_name__icontains=q) |
-                Q(email__icontains=q)
-            )
+            return search.search(qs, q)
 
         return qs.order_by('-date_joined')
 
@@ -272,7 +266,10 @@ class MeProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        if self.request.method == 'GET':
+            return self.request.user
+        # request.user is built from the auth cache; edit the stored row
+        return User.objects.select_related('profile').get(pk=self.request.user.pk)
 
     def patch(self, request, *args, **kwargs):
         return self.partial_update(request, *args, **kwargs)
@@ -293,7 +290,7 @@ class FollowUserView(APIView):
             if user_to_follow == request.user:
                 return Response({'detail': 'Cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
             
-            user_to_follow.followers.add(request.user)
+            Follow.objects.get_or_create(follower=request.user, following=user_to_follow)
             return Response({'detail': f'Now following {user_to_follow.username}'})
         except User.DoesNotExist:
             return Response({'detail': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -301,7 +298,64 @@ class FollowUserView(APIView):
     def delete(self, request, id):
         try:
             user_to_unfollow = User.objects.get(id=id)
-            user_to_unfollow.followers.remove(request.user)
+            Follow.objects.filter(follower=request.user, following=user_to_unfollow).delete()
             return Response({'detail': f'Unfollowed {user_to_unfollow.username}'})
         except User.DoesNotExist:
-            return Response({'detail': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({'detail': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+
+class AvatarUploadView(APIView):
+    """
+    POST /api/auth/users/me/avatar/   multipart "avatar" -> 32/64/256 px variants
+    DELETE /api/auth/users/me/avatar/
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        file_obj = request.FILES.get('avatar')
+        if not file_obj:
+            return Response({'detail': 'No avatar file provided'}, status=status.HTTP_400_BAD_REQUEST)
+        profile, _ = Profile.objects.get_or_create(user=request.user)
+        try:
+            avatars.save_avatar(profile, file_obj)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except StorageError as e:
+            logger.error(f"Avatar upload failed for user {request.user.id}: {e}")
+            return Response({'detail': 'Avatar upload failed'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(ProfileSerializer(profile).data)
+
+    def delete(self, request):
+        profile, _ = Profile.objects.get_or_create(user=request.user)
+        avatars.remove_avatar(profile)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AvatarFileView(APIView):
+    """
+    GET /api/auth/avatars/<name>  (local storage only)
+
+    Names are content hashes, so responses are immutable and the ETag is the name.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def get(self, request, name):
+        if not avatars.FILE_NAME.match(name):
+            raise Http404
+        etag = f'"{name}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponseNotModified()
+        else:
+            storage = get_storage()
+            if not isinstance(storage, LocalStorage):
+                raise Http404
+            try:
+                handle = storage.open(avatars.SUPABASE_BUCKET, name)
+            except StorageError:
+                raise Http404
+            content_type = 'image/png' if name.endswith('.png') else 'image/jpeg'
+            response = FileResponse(handle, content_type=content_type)
+        response['ETag'] = etag
+        response['Cache-Control'] = avatars.CACHE_CONTROL
+        return response
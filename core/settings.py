@@ -11,9 +11,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 import os 
 import logging
+import sys
 
 from dotenv import load_dotenv
 from decouple import config
@@ -100,6 +101,25 @@ DATABASES = {
     }
 }
 
+# Follow sets, feed pages and unread counts live in the default cache.
+# Without CACHE_URL it is per-process memory; set CACHE_URL (e.g.
+# redis://localhost:6379/0) to share one cache when running several processes.
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -146,7 +166,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -287,4 +307,129 @@ def check_environment():
         print(f"🔗 Supabase URL: {supabase_url}")
 
 # Call the check function
-check_environment()
\ No newline at end of file
+check_environment()
+
+# Home timeline fan-out: authors with more followers than this are pulled
+# at read time instead of being pushed into every follower's timeline, and
+# go back to push once they drop to TIMELINE_FANOUT_RESUME_LIMIT. Fan-out
+# and backfills run on TIMELINE_WORKERS background threads (0 = inline).
+TIMELINE_FANOUT_LIMIT = 5000
+TIMELINE_FANOUT_RESUME_LIMIT = 4500
+TIMELINE_BACKFILL_SIZE = 200
+TIMELINE_WORKERS = 2
+
+# Seconds between flushes of buffered like/comment counter deltas (0 = write-through)
+POST_COUNTER_FLUSH_INTERVAL = 2.0
+
+# Feed like/comment counts: 'columns' serves Post.like_count/comment_count,
+# 'aggregate' recounts them per page. In 'columns' mode this fraction of
+# served posts is checked against the real counts and drift is logged.
+FEED_COUNT_SOURCE = 'columns'
+POST_COUNTER_SAMPLE_RATE = 0.01
+
+# Seconds a user's cached follow set lives (it is also dropped on follow/unfollow)
+FOLLOW_CACHE_TTL = 300
+
+# Seconds between background notification batch writes (0 = write synchronously),
+# and how many flushes an event that keeps failing gets before it is dropped
+NOTIFICATION_FLUSH_INTERVAL = 1.0
+NOTIFICATION_MAX_ATTEMPTS = 5
+
+# Merge like/comment notifications on the same post into one unread row
+# for this many seconds ("alice and 241 others liked your post"); 0 disables.
+NOTIFICATION_COALESCE_WINDOW = 3600
+NOTIFICATION_COALESCE_TYPES = ('like', 'comment')
+NOTIFICATION_ACTOR_SAMPLE = 5
+
+# Seconds the cached per-user unread notification count lives
+NOTIFICATION_UNREAD_TTL = 300
+
+# Real-time notification push (served by core/asgi.py). The local broker only
+# reaches clients connected to the same process.
+NOTIFICATION_PUBSUB_BACKEND = 'social.pubsub.LocalBroker'
+NOTIFICATION_STREAM_HEARTBEAT = 15
+# Seconds a single-use stream ticket (POST notifications/stream-ticket/) is valid
+NOTIFICATION_STREAM_TICKET_TTL = 30
+
+# Supabase notification mirror (transactional outbox, see social/outbox.py).
+# Off unless NOTIFICATION_MIRROR_ENABLED is set in the environment; the URL
+# and key default to SUPABASE_URL's notifications table and SUPABASE_KEY.
+NOTIFICATION_MIRROR_ENABLED = config('NOTIFICATION_MIRROR_ENABLED', default=False, cast=bool)
+NOTIFICATION_MIRROR_URL = None
+NOTIFICATION_OUTBOX_INTERVAL = 5.0
+NOTIFICATION_OUTBOX_BATCH_SIZE = 200
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = 10
+
+# Post image pipeline (posts/images.py). Uploads are spooled here and
+# rendered by IMAGE_WORKERS background threads (0 = inline). IMAGE_VARIANTS
+# maps variant name to the longest edge in pixels.
+IMAGE_SPOOL_DIR = os.path.join(BASE_DIR, 'spool')
+IMAGE_WORKERS = 2
+IMAGE_VARIANTS = {'thumbnail': 160, 'feed': 720, 'full': 1600}
+IMAGE_JPEG_QUALITY = 85
+IMAGE_WEBP_QUALITY = 80
+
+# Object storage for post images and avatars (core/storage.py). Defaults to
+# Supabase when SUPABASE_URL/SUPABASE_KEY are set, local MEDIA_ROOT otherwise.
+STORAGE_BACKEND = None
+STORAGE_TIMEOUT = 10
+STORAGE_MAX_CONNECTIONS = 10
+STORAGE_MAX_CONCURRENCY = 8
+
+# Uploads above this size are streamed to a temporary file instead of being
+# buffered in memory, so image uploads are copied to storage chunk by chunk.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+# Square avatar variants rendered on upload (accounts/avatars.py), in pixels
+AVATAR_SIZES = (32, 64, 256)
+
+# Transactional email outbox (accounts/mail.py). Seconds between background
+# sends (0 = only the send_queued_email command sends); the backend defaults
+# to EMAIL_BACKEND, e.g. set the filebased backend for offline runs.
+EMAIL_OUTBOX_INTERVAL = 2.0
+EMAIL_OUTBOX_BACKEND = None
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 8
+
+# Cached home feed pages (social/feed_cache.py): the first FEED_CACHE_PAGES
+# pages per user, in the FEED_CACHE_ALIAS cache; point it at a shared
+# backend in CACHES when running several nodes.
+FEED_CACHE_ALIAS = 'default'
+FEED_CACHE_PAGES = 3
+FEED_CACHE_TTL = 60
+FEED_LIKED_CACHE_TTL = 600
+
+# Fraction of a user search query's trigrams a name must share to match
+# (lower = more typo tolerant), see accounts/search.py
+USER_SEARCH_MIN_SIMILARITY = 0.5
+
+# JWT authentication (accounts/authentication.py) checks tokens against a
+# per-process cache of user state instead of loading the User every call;
+# a deactivation or password change reaches other processes within the TTL.
+AUTH_USER_CACHE_TTL = 60
+AUTH_USER_CACHE_SIZE = 10000
+
+# Tokens issued before the password stamp claim existed are refused once the
+# last refresh token minted without it has expired (refresh rotation copies
+# claims, so they never gain one). Set AUTH_PASSWORD_CLAIM_DEPLOYED_AT to the
+# ISO time the release adding the claim went live; unset, such tokens are
+# still accepted.
+AUTH_PASSWORD_CLAIM_DEPLOYED_AT = config('AUTH_PASSWORD_CLAIM_DEPLOYED_AT', default='')
+AUTH_PASSWORD_CLAIM_REQUIRED_AFTER = (
+    datetime.fromisoformat(AUTH_PASSWORD_CLAIM_DEPLOYED_AT).astimezone(timezone.utc)
+    + SIMPLE_JWT['REFRESH_TOKEN_LIFETIME']
+    if AUTH_PASSWORD_CLAIM_DEPLOYED_AT else None
+)
+
+# The test runner does all background work inline and talks to no outside
+# service: no worker threads, no notification mirror, local file storage.
+# Tests that exercise one of these turn it back on with override_settings.
+if sys.argv[1:2] == ['test']:
+    TIMELINE_WORKERS = 0
+    IMAGE_WORKERS = 0
+    POST_COUNTER_FLUSH_INTERVAL = 0
+    NOTIFICATION_FLUSH_INTERVAL = 0
+    NOTIFICATION_OUTBOX_INTERVAL = 0
+    EMAIL_OUTBOX_INTERVAL = 0
+    NOTIFICATION_MIRROR_ENABLED = False
+    STORAGE_BACKEND = 'core.storage.LocalStorage'
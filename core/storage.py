@@ -0,0 +1,207 @@
+# core/storage.py
+"""
+Object storage shared by post images and avatars.
+
+get_storage() returns one process-wide backend chosen by STORAGE_BACKEND:
+
+    SupabaseStorage  Supabase Storage REST API over a single thread-safe
+                     httpx client, so uploads reuse keep-alive TLS
+                     connections. STORAGE_MAX_CONCURRENCY bounds in-flight
+                     requests and STORAGE_TIMEOUT applies to each one.
+    LocalStorage     files under MEDIA_ROOT/<bucket>/, served from
+                     MEDIA_URL; for tests and offline runs. Also has
+                     open(bucket, path) for views that serve files.
+
+Both implement upload(bucket, path, content, content_type) -> public URL,
+delete(bucket, paths) and public_url(bucket, path), and raise StorageError
+on failure.
+
+write_upload() copies a Django upload to a local file chunk by chunk (or
+in-kernel from its temporary file), so memory per upload stays constant
+whatever its size; the image pipelines spool uploads with it.
+"""
+import logging
+import os
+import shutil
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class StorageError(Exception):
+    pass
+
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+)
+
+
+def sniff_image_type(file_obj):
+    """Image MIME type from the file's magic bytes, or None if unrecognised."""
+    file_obj.seek(0)
+    head = file_obj.read(12)
+    file_obj.seek(0)
+    for signature, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def write_upload(file_obj, dest, digest=None):
+    """
+    Copy a Django upload to dest without holding it in memory, feeding
+    each chunk to `digest` (a hashlib object) on the way if given.
+    """
+    if digest is None and hasattr(file_obj, 'temporary_file_path'):
+        # already on disk: let the kernel copy it (sendfile/copy_file_range)
+        shutil.copyfile(file_obj.temporary_file_path(), dest)
+        return
+    with open(dest, 'wb') as f:
+        for chunk in file_obj.chunks():
+            if digest is not None:
+                digest.update(chunk)
+            f.write(chunk)
+
+
+class SupabaseStorage:
+    def __init__(self, url=None, key=None, timeout=None, max_connections=None, max_concurrency=None):
+        import httpx
+
+        self.url = (url or settings.SUPABASE_URL or '').rstrip('/')
+        key = key or settings.SUPABASE_KEY
+        if not self.url or not key:
+            raise StorageError('SUPABASE_URL and SUPABASE_KEY must be set')
+        max_connections = max_connections or getattr(settings, 'STORAGE_MAX_CONNECTIONS', 10)
+        self._client = httpx.Client(
+            base_url=f"{self.url}/storage/v1/",
+            headers={'apikey': key, 'Authorization': f'Bearer {key}'},
+            timeout=timeout or getattr(settings, 'STORAGE_TIMEOUT', 10),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+        )
+        self._slots = threading.BoundedSemaphore(
+            max_concurrency or getattr(settings, 'STORAGE_MAX_CONCURRENCY', 8)
+        )
+
+    def _request(self, method, path, **kwargs):
+        with self._slots:
+            try:
+                response = self._client.request(method, path, **kwargs)
+                response.raise_for_status()
+            except Exception as e:
+                raise StorageError(f"{method} {path} failed: {e}") from e
+        return response
+
+    def upload(self, bucket, path, content, content_type, upsert=False, cache_control=None):
+        headers = {
+            'content-type': content_type,
+            'x-upsert': 'true' if upsert else 'false',
+        }
+        if cache_control:
+            headers['cache-control'] = cache_control
+        self._request('POST', f"object/{bucket}/{path}", content=content, headers=headers)
+        return self.public_url(bucket, path)
+
+    def delete(self, bucket, paths):
+        if paths:
+            self._request('DELETE', f"object/{bucket}", json={'prefixes': list(paths)})
+
+    def public_url(self, bucket, path):
+        return f"{self.url}/storage/v1/object/public/{bucket}/{path}"
+
+
+class LocalStorage:
+    def __init__(self, root=None, base_url=None):
+        self.root = str(root or settings.MEDIA_ROOT)
+        self.base_url = base_url or settings.MEDIA_URL
+
+    def _path(self, bucket, path):
+        full = os.path.normpath(os.path.join(self.root, bucket, path))
+        if not full.startswith(os.path.join(os.path.normpath(self.root), '')):
+            raise StorageError(f"Path escapes storage root: {path}")
+        return full
+
+    def _write(self, bucket, path, upsert, write):
+        full = self._path(bucket, path)
+        try:
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            # write then rename so readers never see a partial file
+            tmp = f"{full}.{threading.get_ident()}.tmp"
+            write(tmp)
+            if not upsert and os.path.exists(full):
+                os.remove(tmp)
+                raise StorageError(f"{bucket}/{path} already exists")
+            os.replace(tmp, full)
+        except OSError as e:
+            raise StorageError(f"Writing {bucket}/{path} failed: {e}") from e
+        return self.public_url(bucket, path)
+
+    def upload(self, bucket, path, content, content_type, upsert=False, cache_control=None):
+        def write(tmp):
+            with open(tmp, 'wb') as f:
+                f.write(content)
+        return self._write(bucket, path, upsert, write)
+
+    def open(self, bucket, path):
+        try:
+            return open(self._path(bucket, path), 'rb')
+        except OSError as e:
+            raise StorageError(f"Reading {bucket}/{path} failed: {e}") from e
+
+    def delete(self, bucket, paths):
+        for path in paths:
+            try:
+                os.remove(self._path(bucket, path))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                raise StorageError(f"Deleting {bucket}/{path} failed: {e}") from e
+
+    def public_url(self, bucket, path):
+        return f"{self.base_url}{bucket}/{path}"
+
+
+_storage = None
+_local = None
+_lock = threading.Lock()
+
+
+def default_backend():
+    if getattr(settings, 'SUPABASE_URL', None) and getattr(settings, 'SUPABASE_KEY', None):
+        return 'core.storage.SupabaseStorage'
+    return 'core.storage.LocalStorage'
+
+
+def get_storage():
+    """The process-wide storage backend."""
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                path = getattr(settings, 'STORAGE_BACKEND', None) or default_backend()
+                _storage = import_string(path)()
+    return _storage
+
+
+def get_local_storage():
+    """Filesystem storage, used as the fallback when the main backend fails."""
+    global _local
+    if _local is None:
+        with _lock:
+            if _local is None:
+                _local = LocalStorage()
+    return _local
+
+
+def reset():
+    """Drop the cached backends (tests that change storage settings)."""
+    global _storage, _local
+    with _lock:
+        _storage = _local = None
@@ -0,0 +1,73 @@
+import threading
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import EmailOutbox
+
+from .workers import OUTBOX_PARKED, PeriodicWorker, claim_batch, defer_batch
+
+
+class PeriodicWorkerTests(TestCase):
+    def test_runs_target_and_survives_errors(self):
+        calls = []
+        done = threading.Event()
+
+        def target():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError('first run fails')
+            done.set()
+
+        worker = PeriodicWorker('test-worker', target, 'TEST_WORKER_INTERVAL', 0.01)
+        self.addCleanup(worker.stop, 1)
+        with self.assertLogs('core.workers', 'ERROR'):
+            worker.ensure_running()
+            worker.ensure_running()
+            self.assertTrue(done.wait(2))
+        self.assertGreaterEqual(len(calls), 2)
+
+    @override_settings(TEST_WORKER_INTERVAL=0)
+    def test_zero_interval_starts_nothing(self):
+        worker = PeriodicWorker('test-worker', lambda: None, 'TEST_WORKER_INTERVAL', 1.0)
+        worker.ensure_running()
+        self.assertFalse(worker.is_running())
+
+
+class ClaimBatchTests(TestCase):
+    def queue(self, n):
+        return [
+            EmailOutbox.objects.create(subject=f'Hello {i}', body='body', from_email='a@example.com', to=['b@example.com'])
+            for i in range(n)
+        ]
+
+    def test_claimed_rows_are_not_handed_out_twice(self):
+        self.queue(3)
+
+        first = claim_batch(EmailOutbox.objects.all(), 2)
+        second = claim_batch(EmailOutbox.objects.all(), 2)
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({row.id for row in first} & {row.id for row in second})
+        self.assertEqual(claim_batch(EmailOutbox.objects.all(), 2), [])
+
+    def test_expired_lease_is_due_again(self):
+        self.queue(1)
+        claim_batch(EmailOutbox.objects.all(), 10, lease=60)
+        EmailOutbox.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(len(claim_batch(EmailOutbox.objects.all(), 10)), 1)
+
+    def test_rows_out_of_attempts_are_parked(self):
+        self.queue(1)
+        rows = claim_batch(EmailOutbox.objects.all(), 10)
+
+        with self.assertLogs('core.workers', 'ERROR'):
+            defer_batch(rows, 'boom', lambda attempts: timedelta(0), max_attempts=1)
+
+        row = EmailOutbox.objects.get()
+        self.assertEqual(row.status, OUTBOX_PARKED)
+        self.assertEqual(row.last_error, 'boom')
+        self.assertEqual(claim_batch(EmailOutbox.objects.all(), 10), [])
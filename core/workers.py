@@ -0,0 +1,156 @@
+# core/workers.py
+"""
+Background work shared by the write-behind buffers, worker pools and
+outboxes.
+
+PeriodicWorker calls a function every few seconds on a daemon thread that
+is started on first use, with fresh database connections for each run and
+errors logged rather than killing the thread. Its interval is read from a
+setting on every tick; 0 means the owner does the work itself, inline or
+from a management command.
+
+WorkerPool runs one-off jobs (image processing, timeline fan-out) off the
+request path on a lazily created thread pool sized by a setting; 0 runs
+each job inline, which is what tests and one-process scripts want.
+
+claim_batch() and defer_batch() implement the outbox side: due rows are
+leased to exactly one drainer with a conditional UPDATE before anything is
+sent, so several web processes draining the same table never deliver a
+row twice, and rows that keep failing are parked instead of retried
+forever. Outbox models need attempts, next_attempt_at, last_error,
+claimed_by and status fields.
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PENDING = 'pending'
+OUTBOX_PARKED = 'parked'
+
+OUTBOX_STATUS_CHOICES = [
+    (OUTBOX_PENDING, 'Pending'),
+    (OUTBOX_PARKED, 'Parked'),
+]
+
+
+class PeriodicWorker:
+    """Daemon thread calling `target` every `interval_setting` seconds."""
+
+    def __init__(self, name, target, interval_setting, default_interval):
+        self.name = name
+        self.target = target
+        self.interval_setting = interval_setting
+        self.default_interval = default_interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def interval(self):
+        return getattr(settings, self.interval_setting, self.default_interval)
+
+    def is_running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def ensure_running(self):
+        if not self.interval or self.is_running():
+            return
+        with self._lock:
+            if not self.is_running():
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop,), name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the thread after its current run; ensure_running() starts a new one."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stop.set()
+        if thread:
+            thread.join(timeout)
+
+    def _run(self, stop):
+        while not stop.wait(self.interval):
+            close_old_connections()
+            try:
+                self.target()
+            except Exception as e:
+                logger.error(f"{self.name} run failed: {e}")
+
+
+class WorkerPool:
+    """Process-wide pool of `workers_setting` threads for background jobs."""
+
+    def __init__(self, name, workers_setting, default_workers):
+        self.name = name
+        self.workers_setting = workers_setting
+        self.default_workers = default_workers
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def workers(self):
+        return getattr(settings, self.workers_setting, self.default_workers)
+
+    def submit(self, fn, *args):
+        if not self.workers:
+            fn(*args)
+            return
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        self._executor.submit(self._run, fn, args)
+
+    def _run(self, fn, args):
+        close_old_connections()
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.error(f"{self.name} job {fn.__name__} failed: {e}")
+        finally:
+            close_old_connections()
+
+
+def claim_batch(queryset, batch_size, lease=300):
+    """
+    Lease up to `batch_size` due rows of an outbox to this caller and return
+    them. Claimed rows are pushed `lease` seconds into the future, so a
+    drainer that picked the same IDs concurrently claims none of them, and a
+    crashed drainer's rows come due again once the lease runs out.
+    """
+    now = timezone.now()
+    due = queryset.filter(status=OUTBOX_PENDING, next_attempt_at__lte=now)
+    ids = list(due.order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    claimed = due.filter(id__in=ids).update(
+        next_attempt_at=now + timedelta(seconds=lease), claimed_by=token
+    )
+    if not claimed:
+        return []
+    return list(queryset.model.objects.filter(id__in=ids, claimed_by=token).order_by('id'))
+
+
+def defer_batch(rows, error, backoff, max_attempts):
+    """Schedule claimed rows for a retry after backoff(attempts), parking those out of attempts."""
+    if not rows:
+        return
+    now = timezone.now()
+    for row in rows:
+        row.attempts += 1
+        row.next_attempt_at = now + backoff(row.attempts)
+        row.last_error = str(error)[:1000]
+        if row.attempts >= max_attempts:
+            row.status = OUTBOX_PARKED
+            logger.error(f"Parking {type(row).__name__} {row.id} after {row.attempts} attempts: {error}")
+    type(rows[0]).objects.bulk_update(rows, ['attempts', 'next_attempt_at', 'last_error', 'status'])
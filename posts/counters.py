@@ -0,0 +1,183 @@
+# posts/counters.py
+"""
+Write-behind maintenance of Post.like_count and Post.comment_count.
+
+Like/comment signals record +1/-1 deltas in a process-wide buffer instead
+of recounting and saving the whole post. A delta is buffered only once the
+transaction that caused it commits, so a rolled-back like is never counted. A daemon thread flushes the buffer
+every POST_COUNTER_FLUSH_INTERVAL seconds as one in-database F() update per
+post, so a burst of likes on a viral post collapses into a single UPDATE and
+concurrent writers never overwrite each other. An interval of 0 writes each
+delta straight through, inside the caller's transaction. Post.save() leaves
+the counter columns alone, so an ordinary edit cannot overwrite them either.
+
+reconcile_counts() recomputes drifted rows from the source tables.
+"""
+import atexit
+import logging
+import random
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from core.workers import PeriodicWorker
+
+from .models import COUNTER_FIELDS, Post
+
+logger = logging.getLogger(__name__)
+
+
+def _apply(post_id, deltas):
+    updates = {
+        field: Greatest(F(field) + delta, Value(0))
+        for field, delta in deltas.items() if delta
+    }
+    if updates:
+        Post.objects.filter(id=post_id).update(**updates)
+
+
+class CounterBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self.worker = PeriodicWorker('post-counter-flusher', self.flush, 'POST_COUNTER_FLUSH_INTERVAL', 2.0)
+
+    @property
+    def interval(self):
+        return self.worker.interval
+
+    def add(self, post_id, field, delta):
+        if field not in COUNTER_FIELDS:
+            raise ValueError(f"Unknown counter field: {field}")
+        if not self.interval:
+            _apply(post_id, {field: delta})
+            return
+        transaction.on_commit(lambda: self._record(post_id, field, delta))
+
+    def _record(self, post_id, field, delta):
+        with self._lock:
+            self._pending[post_id][field] += delta
+        self.worker.ensure_running()
+
+    def flush(self):
+        """Write all pending deltas. Returns the number of posts updated."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+        if not pending:
+            return 0
+        try:
+            with transaction.atomic():
+                for post_id, deltas in pending.items():
+                    _apply(post_id, deltas)
+        except Exception as e:
+            logger.error(f"Counter flush failed, requeueing {len(pending)} posts: {e}")
+            with self._lock:
+                for post_id, deltas in pending.items():
+                    for field, delta in deltas.items():
+                        self._pending[post_id][field] += delta
+            return 0
+        return len(pending)
+
+    def pending(self, post_id, field):
+        """Delta recorded for a post but not yet flushed."""
+        with self._lock:
+            deltas = self._pending.get(post_id)
+            return deltas.get(field, 0) if deltas else 0
+
+
+counter_buffer = CounterBuffer()
+atexit.register(counter_buffer.flush)
+
+
+def increment(post_id, field, delta=1):
+    counter_buffer.add(post_id, field, delta)
+
+
+def decrement(post_id, field, delta=1):
+    counter_buffer.add(post_id, field, -delta)
+
+
+def sample_drift(posts, rate=None):
+    """
+    Compare the stored counters of a random fraction of `posts` against the
+    real like/comment counts and log any drift. Costs one aggregate query
+    when a sample is taken and nothing otherwise. Returns the drifted IDs.
+    """
+    from social.models import Comment, Like
+
+    if rate is None:
+        rate = getattr(settings, 'POST_COUNTER_SAMPLE_RATE', 0.01)
+    sample = [post for post in posts if random.random() < rate]
+    if not sample:
+        return []
+
+    ids = [post.id for post in sample]
+    likes = dict(
+        Like.objects.filter(post_id__in=ids)
+        .order_by().values('post_id').annotate(c=Count('id')).values_list('post_id', 'c')
+    )
+    comments = dict(
+        Comment.objects.filter(post_id__in=ids, is_active=True)
+        .order_by().values('post_id').annotate(c=Count('id')).values_list('post_id', 'c')
+    )
+
+    drifted = []
+    for post in sample:
+        stored = (
+            post.like_count + counter_buffer.pending(post.id, 'like_count'),
+            post.comment_count + counter_buffer.pending(post.id, 'comment_count'),
+        )
+        real = (likes.get(post.id, 0), comments.get(post.id, 0))
+        if stored != real:
+            drifted.append(post.id)
+            logger.warning(
+                f"Counter drift on post {post.id}: stored likes/comments {stored}, actual {real}"
+            )
+    return drifted
+
+
+def reconcile_counts(batch_size=500):
+    """
+    Recompute like/comment counts for posts whose stored value has drifted.
+    Returns the number of posts corrected.
+    """
+    from social.models import Comment, Like
+
+    counter_buffer.flush()
+
+    likes = (
+        Like.objects.filter(post=OuterRef('pk'))
+        .order_by().values('post').annotate(c=Count('id')).values('c')
+    )
+    comments = (
+        Comment.objects.filter(post=OuterRef('pk'), is_active=True)
+        .order_by().values('post').annotate(c=Count('id')).values('c')
+    )
+    drifted = (
+        Post.objects.annotate(
+            real_like_count=Coalesce(Subquery(likes), 0),
+            real_comment_count=Coalesce(Subquery(comments), 0),
+        )
+        .exclude(like_count=F('real_like_count'), comment_count=F('real_comment_count'))
+        .only('id', 'like_count', 'comment_count')
+        .order_by()
+    )
+
+    fixed = 0
+    batch = []
+    for post in drifted.iterator(chunk_size=batch_size):
+        post.like_count = post.real_like_count
+        post.comment_count = post.real_comment_count
+        batch.append(post)
+        if len(batch) >= batch_size:
+            Post.objects.bulk_update(batch, COUNTER_FIELDS)
+            fixed += len(batch)
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, COUNTER_FIELDS)
+        fixed += len(batch)
+    return fixed
@@ -0,0 +1,264 @@
+# posts/images.py
+"""
+Background processing of post images.
+
+Uploads are streamed to IMAGE_SPOOL_DIR, hashed on the way, and the
+request returns straight away with the post marked image_status='pending'.
+Once the transaction commits, a worker from a process-wide pool decodes the
+spooled file and renders each IMAGE_VARIANTS size as a metadata-free JPEG
+(PNG when the image has transparency) plus a WebP copy, uploads them, and
+swaps image_url/image_variants in with one conditional UPDATE. The UPDATE
+only applies while the post still points at the same job, so a slow job
+never overwrites a newer upload or a removal. IMAGE_WORKERS = 0 processes
+inline.
+
+Variants are content-addressed: they are stored once per distinct upload
+(sha256 of the original bytes) in an ImageBlob whose ref_count tracks the
+posts using it, so a reposted image is neither rendered nor stored again.
+Blobs whose count drops to zero are deleted together with their objects.
+
+The process_post_images command picks up pending posts whose spool file
+survived a restart. image_ready is sent after a swap, since the UPDATE
+sends no post_save.
+"""
+import hashlib
+import io
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, ProtectedError, Value
+from django.db.models.functions import Greatest
+from django.dispatch import Signal
+
+from core.storage import write_upload
+from core.workers import WorkerPool
+
+from .models import ImageBlob, Post
+from .supabase_utils import delete_image_objects, store_image_bytes
+
+logger = logging.getLogger(__name__)
+
+# sent with post_id and author_id once a processed image is swapped in
+image_ready = Signal()
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    logger.warning("Pillow not installed. Post images will be stored without resizing.")
+    PIL_AVAILABLE = False
+
+EXTENSIONS = {'image/jpeg': 'jpg', 'image/jpg': 'jpg', 'image/png': 'png'}
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+
+
+def spool_dir():
+    return getattr(settings, 'IMAGE_SPOOL_DIR', os.path.join(settings.MEDIA_ROOT, 'spool'))
+
+
+def spool_path(job):
+    return os.path.join(spool_dir(), job)
+
+
+def variant_sizes():
+    return getattr(settings, 'IMAGE_VARIANTS', {'thumbnail': 160, 'feed': 720, 'full': 1600})
+
+
+def spool(file_obj):
+    """Write an upload to the spool directory. Returns the job name, "<sha256>-<nonce>.<ext>"."""
+    os.makedirs(spool_dir(), exist_ok=True)
+    digest = hashlib.sha256()
+    tmp = spool_path(f"{uuid.uuid4().hex}.part")
+    write_upload(file_obj, tmp, digest)
+    job = f"{digest.hexdigest()}-{uuid.uuid4().hex[:8]}.{EXTENSIONS.get(file_obj.content_type, 'jpg')}"
+    os.replace(tmp, spool_path(job))
+    return job
+
+
+def parse_job(job):
+    """(digest, ext) of a job name."""
+    stem, ext = job.rsplit('.', 1)
+    return stem.split('-', 1)[0], ext
+
+
+def discard(job):
+    try:
+        os.remove(spool_path(job))
+    except FileNotFoundError:
+        pass
+
+
+# fields attach() and clear() change, for the caller's save(update_fields=...)
+ATTACH_FIELDS = ('image_job', 'image_status')
+CLEAR_FIELDS = ('image_url', 'image_variants', 'image_status', 'image_job', 'image_blob')
+
+
+def attach(post, file_obj):
+    """Spool file_obj as the post's next image. The caller saves the post."""
+    if post.image_job:
+        discard(post.image_job)
+    post.image_job = spool(file_obj)
+    post.image_status = Post.IMAGE_PENDING
+
+
+def clear(post):
+    """
+    Drop the post's image and any job in flight. The caller saves the post
+    and then passes the returned blob digest to release().
+    """
+    if post.image_job:
+        discard(post.image_job)
+    released = post.image_blob_id
+    post.image_url = None
+    post.image_variants = {}
+    post.image_status = ''
+    post.image_job = ''
+    post.image_blob = None
+    return released
+
+
+def schedule(post):
+    """Process the post's pending image once the current transaction commits."""
+    if post.image_job:
+        post_id, job = post.id, post.image_job
+        transaction.on_commit(lambda: pipeline.submit(process, post_id, job))
+
+
+def render(path):
+    """Yield (name, image) per variant: oriented, downscaled, metadata stripped."""
+    with Image.open(path) as source:
+        source = ImageOps.exif_transpose(source)
+        has_alpha = source.mode in ('RGBA', 'LA') or (
+            source.mode == 'P' and 'transparency' in source.info
+        )
+        source = source.convert('RGBA' if has_alpha else 'RGB')
+    for name, size in variant_sizes().items():
+        image = source.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        # EXIF, ICC and text chunks only reach the encoder through info
+        image.info = {}
+        yield name, image
+
+
+def encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'jpg':
+        image.save(buffer, 'JPEG', quality=getattr(settings, 'IMAGE_JPEG_QUALITY', 85),
+                   optimize=True, progressive=True)
+    elif fmt == 'png':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.save(buffer, 'WEBP', quality=getattr(settings, 'IMAGE_WEBP_QUALITY', 80), method=4)
+    return buffer.getvalue()
+
+
+def build_variants(path, base, ext):
+    if not PIL_AVAILABLE:
+        with open(path, 'rb') as f:
+            url = store_image_bytes(f.read(), f"{base}_full.{ext}", CONTENT_TYPES[ext])
+        if not url:
+            raise RuntimeError(f"Upload of {base} failed")
+        return {'full': {'url': url}}
+
+    variants = {}
+    for name, image in render(path):
+        fmt = 'png' if image.mode == 'RGBA' else 'jpg'
+        entry = {'width': image.width, 'height': image.height}
+        for key, variant_fmt in (('url', fmt), ('webp', 'webp')):
+            path = f"{base}_{name}.{variant_fmt}"
+            entry[key] = store_image_bytes(encode(image, variant_fmt), path, CONTENT_TYPES[variant_fmt])
+            if not entry[key]:
+                raise RuntimeError(f"Upload of {path} failed")
+        variants[name] = entry
+    return variants
+
+
+def blob_base(digest):
+    return f"images/{digest[:2]}/{digest}"
+
+
+def blob_paths(blob):
+    base = blob_base(blob.digest)
+    return [
+        f"{base}_{name}.{entry[key].rsplit('.', 1)[1]}"
+        for name, entry in blob.variants.items()
+        for key in ('url', 'webp') if entry.get(key)
+    ]
+
+
+def acquire(digest, path, ext):
+    """Take a reference on the blob for `digest`, rendering and uploading it if new."""
+    if ImageBlob.objects.filter(digest=digest).update(ref_count=F('ref_count') + 1):
+        return ImageBlob.objects.get(digest=digest)
+    variants = build_variants(path, blob_base(digest), ext)
+    blob, created = ImageBlob.objects.get_or_create(
+        digest=digest, defaults={'variants': variants, 'ref_count': 1}
+    )
+    if not created:
+        # another worker rendered the same image meanwhile
+        ImageBlob.objects.filter(digest=digest).update(ref_count=F('ref_count') + 1)
+    return blob
+
+
+def release(digest):
+    """Drop one reference to a blob; unreferenced blobs are collected after commit."""
+    if not digest:
+        return
+    ImageBlob.objects.filter(digest=digest).update(ref_count=Greatest(F('ref_count') - 1, Value(0)))
+    transaction.on_commit(lambda: collect([digest]))
+
+
+def collect(digests=None):
+    """Delete unreferenced blobs and their stored objects. Returns the number removed."""
+    blobs = ImageBlob.objects.filter(ref_count=0)
+    if digests is not None:
+        blobs = blobs.filter(digest__in=digests)
+    removed = 0
+    for blob in blobs:
+        # re-check the count in the DELETE so a concurrent acquire() wins
+        try:
+            deleted, _ = ImageBlob.objects.filter(digest=blob.digest, ref_count=0).delete()
+        except ProtectedError:
+            logger.warning(f"Image blob {blob.digest[:12]} has a zero count but is still in use")
+            continue
+        if deleted:
+            delete_image_objects(blob_paths(blob))
+            removed += 1
+    return removed
+
+
+def process(post_id, job):
+    """Render (or reuse), upload and swap in one spooled image. Returns True if applied."""
+    pending = Post.objects.filter(id=post_id, image_job=job)
+    try:
+        if not pending.exists():
+            # replaced, removed or deleted while queued
+            return False
+        digest, ext = parse_job(job)
+        blob = acquire(digest, spool_path(job), ext)
+        with transaction.atomic():
+            previous, author_id = pending.values_list('image_blob_id', 'author_id').first() or (None, None)
+            applied = pending.update(
+                image_url=blob.variants['full']['url'],
+                image_variants=blob.variants,
+                image_blob=blob,
+                image_status=Post.IMAGE_READY,
+                image_job='',
+            )
+            release(previous if applied else digest)
+        logger.info(f"Processed image for post {post_id} (blob {digest[:12]})")
+        if applied:
+            image_ready.send(sender=Post, post_id=post_id, author_id=author_id)
+        return bool(applied)
+    except Exception as e:
+        logger.error(f"Image processing failed for post {post_id}: {e}")
+        pending.update(image_status=Post.IMAGE_FAILED, image_job='')
+        return False
+    finally:
+        discard(job)
+
+
+pipeline = WorkerPool('post-images', 'IMAGE_WORKERS', 2)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts.images import collect
+
+
+class Command(BaseCommand):
+    help = "Delete image blobs no longer referenced by any post, with their stored variants"
+
+    def handle(self, *args, **options):
+        removed = collect()
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} unreferenced image blobs"))
@@ -0,0 +1,23 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts import images
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Process post images still pending from spool (e.g. after a restart)"
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        pending = Post.objects.filter(image_status=Post.IMAGE_PENDING).exclude(image_job='')
+        for post_id, job in pending.values_list('id', 'image_job').iterator():
+            if not os.path.exists(images.spool_path(job)):
+                Post.objects.filter(id=post_id, image_job=job).update(image_status=Post.IMAGE_FAILED, image_job='')
+                failed += 1
+            elif images.process(post_id, job):
+                processed += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} images, {failed} failed"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.like_count and Post.comment_count where they have drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        fixed = reconcile_counts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled counters on {fixed} posts"))
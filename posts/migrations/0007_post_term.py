@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_index(apps, schema_editor):
+    from posts.search import tokenize
+
+    Post = apps.get_model('posts', 'Post')
+    PostTerm = apps.get_model('posts', 'PostTerm')
+    rows = []
+    for post in Post.objects.filter(is_active=True).iterator():
+        rows.extend(
+            PostTerm(post_id=post.id, term=term, kind=kind, weight=weight, created_at=post.created_at)
+            for term, (kind, weight) in tokenize(post.content).items()
+        )
+    PostTerm.objects.bulk_create(rows, batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_image_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('kind', models.CharField(choices=[('word', 'Word'), ('hashtag', 'Hashtag'), ('mention', 'Mention')], default='word', max_length=10)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='posts.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', '-created_at', '-post'], name='posts_term_created_idx')],
+                'unique_together': {('term', 'post')},
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,21 @@
 from django.db import models
 from django.conf import settings
 
+# written only by in-database F() updates; see posts/counters.py
+COUNTER_FIELDS = ('like_count', 'comment_count')
+
+
+class ImageBlob(models.Model):
+    """Processed variants of one distinct upload, shared by every post that uses it."""
+    digest = models.CharField(max_length=64, primary_key=True)  # sha256 of the original upload
+    variants = models.JSONField(default=dict)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.digest[:12]} ({self.ref_count} refs)'
+
+
 class Post(models.Model):
     CATEGORY_GENERAL = 'general'
     CATEGORY_ANNOUNCEMENT = 'announcement'
@@ -13,12 +28,28 @@ class Post(models.Model):
         (CATEGORY_QUESTION, 'Question'),
     ]
 
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    ]
+
     # Fixed: content field instead of title/description
     content = models.TextField(max_length=280)  # Main content field as per requirements
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='posts')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     image_url = models.URLField(blank=True, null=True)
+    # {"thumbnail": {"url", "webp", "width", "height"}, "feed": ..., "full": ...}
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, blank=True, default='')
+    image_blob = models.ForeignKey(ImageBlob, null=True, blank=True, on_delete=models.PROTECT, related_name='+')
+    # spool file of the upload being processed; see posts/images.py
+    image_job = models.CharField(max_length=100, blank=True, default='')
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default=CATEGORY_GENERAL)
     is_active = models.BooleanField(default=True)
     like_count = models.PositiveIntegerField(default=0)
@@ -26,6 +57,65 @@ class Post(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # keyset pagination of the post list
+            models.Index(fields=['-created_at', '-id'], name='posts_created_id_idx'),
+            # pull path for high-follower authors in the home timeline
+            models.Index(fields=['author', '-created_at'], name='posts_author_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.author.username}: {self.content[:50]}'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the stored flag, so Profile.posts_count can follow activations
+        # without re-reading the row on save (see social/signals.py)
+        if 'is_active' in field_names:
+            instance._loaded_is_active = instance.is_active
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Saving a loaded post would write back the counters it was loaded
+        # with, undoing any like or comment counted since.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            skip = set(COUNTER_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skip
+            ]
+        super().save(*args, **kwargs)
+
+class PostTerm(models.Model):
+    """
+    Inverted index over post content: one row per distinct word, #hashtag
+    or @mention of each active post, kept in sync by posts/signals.py. See
+    posts/search.py.
+    """
+    KIND_WORD = 'word'
+    KIND_HASHTAG = 'hashtag'
+    KIND_MENTION = 'mention'
+
+    KIND_CHOICES = [
+        (KIND_WORD, 'Word'),
+        (KIND_HASHTAG, 'Hashtag'),
+        (KIND_MENTION, 'Mention'),
+    ]
+
+    # words are stored bare, hashtags as "#tag" and mentions as "@name"
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='terms')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=KIND_WORD)
+    weight = models.PositiveSmallIntegerField(default=1)
+    # copy of post.created_at, so a hashtag page is one ordered index range
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('term', 'post')
+        indexes = [
+            models.Index(fields=['term', '-created_at', '-post'], name='posts_term_created_idx'),
+        ]
 
     def __str__(self):
-        return f'{self.author.username}: {self.content[:50]}'
\ No newline at end of file
+        return f"{self.term!r} -> {self.post_id}"
@@ -0,0 +1,147 @@
+# posts/pagination.py
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(created_at, pk):
+    """Opaque cursor for a (created_at, id) position."""
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """Inverse of encode_cursor. Returns None for an empty cursor (first page)."""
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise NotFound('Invalid cursor')
+
+
+def keyset_filter(position, descending=True, created_field='created_at', pk_field='id'):
+    """Rows strictly after `position` in (created_at, id) order."""
+    created_at, pk = position
+    op = 'lt' if descending else 'gt'
+    return (
+        Q(**{f'{created_field}__{op}': created_at})
+        | Q(**{created_field: created_at, f'{pk_field}__{op}': pk})
+    )
+
+
+def encode_ranked_cursor(rank, created_at, pk):
+    """Opaque cursor for a (rank, created_at, id) position in ranked results."""
+    raw = f"{rank}|{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_ranked_cursor(value):
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode()
+        rank, created_at, pk = raw.split('|')
+        return int(rank), datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise NotFound('Invalid cursor')
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset mode.
+
+    Passing ?cursor= (empty for the first page) switches to (created_at, id)
+    keyset pagination: no COUNT(*) and no OFFSET, so every page costs the same.
+    Subclasses can set keyset_only to always paginate that way, and
+    created_field/pk_field to page through another model's copy of the key.
+    """
+    cursor_query_param = 'cursor'
+    descending = True
+    keyset_only = False
+    created_field = 'created_at'
+    pk_field = 'id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.keyset_only or self.cursor_query_param in request.query_params
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = decode_cursor(request.query_params.get(self.cursor_query_param))
+        prefix = '-' if self.descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.created_field}', f'{prefix}{self.pk_field}')
+        if position:
+            queryset = queryset.filter(
+                keyset_filter(position, self.descending, self.created_field, self.pk_field)
+            )
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page_rows = rows[:page_size]
+        return self.page_rows
+
+    def get_next_cursor(self):
+        if not self.has_next:
+            return None
+        last = self.page_rows[-1]
+        return encode_cursor(getattr(last, self.created_field), getattr(last, self.pk_field))
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        next_cursor = self.get_next_cursor()
+        next_url = None
+        if next_cursor:
+            next_url = replace_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param, next_cursor
+            )
+        return Response({
+            'next': next_url,
+            'next_cursor': next_cursor,
+            'has_next': self.has_next,
+            'results': data,
+        })
+
+
+class RankedKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination over results ordered by a rank annotation, then
+    (created_at, id). The rank is an aggregate, so the position filter lands
+    in HAVING; pages still cost the same however deep they are.
+    """
+    keyset_only = True
+    rank_field = 'rank'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = decode_ranked_cursor(request.query_params.get(self.cursor_query_param))
+        queryset = queryset.order_by(f'-{self.rank_field}', '-created_at', '-id')
+        if position:
+            rank, created_at, pk = position
+            queryset = queryset.filter(
+                Q(**{f'{self.rank_field}__lt': rank})
+                | Q(**{self.rank_field: rank}) & keyset_filter((created_at, pk))
+            )
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page_rows = rows[:page_size]
+        return self.page_rows
+
+    def get_next_cursor(self):
+        if not self.has_next:
+            return None
+        last = self.page_rows[-1]
+        return encode_ranked_cursor(getattr(last, self.rank_field), last.created_at, last.pk)
@@ -0,0 +1,97 @@
+# posts/search.py
+"""
+Full-text search over post content.
+
+Posts are tokenized when they are written: every distinct word, #hashtag
+and @mention of an active post gets a PostTerm row, and deactivating a
+post drops its rows. Hashtags and mentions are also indexed as plain
+words, so "python" finds posts tagged #python, while "#python" only finds
+the tag. A search is one indexed join on the terms of the query: posts
+matching more of them rank first, then posts that tag or mention them.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import PostTerm
+
+MAX_TERM_LENGTH = 63
+KIND_WEIGHTS = {PostTerm.KIND_WORD: 1, PostTerm.KIND_MENTION: 2, PostTerm.KIND_HASHTAG: 3}
+# the bare word of a #hashtag or @mention outweighs an incidental use of it
+TAGGED_WORD_WEIGHT = 2
+PREFIXES = {'#': PostTerm.KIND_HASHTAG, '@': PostTerm.KIND_MENTION}
+
+# a word, optionally introduced by # or @ (not in the middle of a word, as in emails)
+TOKEN = re.compile(r'(?<!\w)([#@]?)([^\W_][\w]*)')
+
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from has have i in is it its of on or
+    so that the this to was were will with you your
+""".split())
+
+
+def tokenize(text):
+    """{term: (kind, weight)} for a piece of text."""
+    terms = {}
+    for prefix, word in TOKEN.findall((text or '').casefold()):
+        word = word[:MAX_TERM_LENGTH]
+        kind = PREFIXES.get(prefix, PostTerm.KIND_WORD)
+        if kind != PostTerm.KIND_WORD:
+            terms[prefix + word] = (kind, KIND_WEIGHTS[kind])
+        if len(word) > 1 and word not in STOPWORDS:
+            weight = TAGGED_WORD_WEIGHT if prefix else KIND_WEIGHTS[PostTerm.KIND_WORD]
+            if weight > terms.get(word, (None, 0))[1]:
+                terms[word] = (PostTerm.KIND_WORD, weight)
+    return terms
+
+
+def query_terms(query):
+    """Index terms to look up for a query; "#tag" and "@name" stay exact."""
+    terms = set()
+    for prefix, word in TOKEN.findall((query or '').casefold()):
+        word = word[:MAX_TERM_LENGTH]
+        if prefix:
+            terms.add(prefix + word)
+        elif len(word) > 1 and word not in STOPWORDS:
+            terms.add(word)
+    return terms
+
+
+def hashtag(tag):
+    """Index term for a tag given with or without its '#'."""
+    return '#' + tag.lstrip('#').casefold()[:MAX_TERM_LENGTH]
+
+
+def index_post(post):
+    """Bring the post's index rows in line with its content and status."""
+    wanted = tokenize(post.content) if post.is_active else {}
+    with transaction.atomic():
+        current = dict(PostTerm.objects.filter(post=post).values_list('term', 'weight'))
+        stale = [term for term, weight in current.items() if term not in wanted or wanted[term][1] != weight]
+        if stale:
+            PostTerm.objects.filter(post=post, term__in=stale).delete()
+        PostTerm.objects.bulk_create([
+            PostTerm(post=post, term=term, kind=kind, weight=weight, created_at=post.created_at)
+            for term, (kind, weight) in wanted.items() if current.get(term) != weight
+        ])
+
+
+def rebuild_index(posts, batch_size=500):
+    """Reindex every post in `posts`. Returns the number indexed."""
+    count = 0
+    for post in posts.iterator(chunk_size=batch_size):
+        index_post(post)
+        count += 1
+    return count
+
+
+def search(queryset, query):
+    """Filter a Post queryset to matches for `query`, annotated with search_rank."""
+    terms = query_terms(query)
+    queryset = (
+        queryset.filter(terms__term__in=terms)
+        .annotate(search_rank=Sum('terms__weight'))
+        .order_by('-search_rank', '-created_at', '-id')
+    )
+    return queryset if terms else queryset.none()
@@ -114,9 +114,9 @@
 from rest_framework import serializers
 from .models import Post
 from django.utils import timezone
-import uuid
 import logging
-from .supabase_utils import upload_image_to_supabase, validate_image_file, save_image_locally
+from . import images
+from .supabase_utils import validate_image_file
 from accounts.serializers import UserListSerializer
 
 logger = logging.getLogger(__name__)
@@ -133,7 +133,7 @@ class PostListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
         fields = (
-            'id', 'content', 'author', 'image_url',
+            'id', 'content', 'author', 'image_url', 'image_variants', 'image_status',
             'category', 'is_active', 'like_count', 'comment_count',
             'created_at', 'updated_at'
         )
@@ -145,8 +145,8 @@ class PostCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Post
-        fields = ('id', 'content', 'image_file', 'image_url', 'category')
-        read_only_fields = ('id', 'image_url')
+        fields = ('id', 'content', 'image_file', 'image_url', 'image_status', 'category')
+        read_only_fields = ('id', 'image_url', 'image_status')
 
     def validate_content(self, value):
         if not value or len(value.strip()) == 0:
@@ -184,38 +184,13 @@ class PostCreateSerializer(serializers.ModelSerializer):
         image_file = validated_data.pop('image_file', None)
 
         try:
-            # Create post without image first
-            post = Post.objects.create(author=user, **validated_data)
-            logger.info(f"Created post {post.id} by user {user.username}")
-
-            # Handle image upload if present
+            post = Post(author=user, **validated_data)
+            # Spool the image; variants are rendered and uploaded in the background
             if image_file:
-                logger.info(f"Processing image upload for post {post.id}")
-                
-                try:
-                    # Generate unique filename
-                    ext = 'jpg' if image_file.content_type == 'image/jpeg' else 'png'
-                    dest_path = f'posts/{user.id}/post_{post.id}_{uuid.uuid4().hex}.{ext}'
-                    
-                    # Try Supabase upload first
-                    public_url = upload_image_to_supabase(image_file, dest_path)
-                    
-                    # If Supabase fails, try local storage
-                    if not public_url:
-                        logger.warning(f"Supabase upload failed for post {post.id}, trying local storage")
-                        public_url = save_image_locally(image_file, dest_path)
-                    
-                    if public_url:
-                        post.image_url = public_url
-                        post.save()
-                        logger.info(f"Successfully uploaded image for post {post.id}: {public_url}")
-                    else:
-                        logger.warning(f"All image upload methods failed for post {post.id}")
-                        
-                except Exception as e:
-                    logger.error(f"Image upload failed for post {post.id}: {e}")
-                    # Don't fail the entire post creation - just continue without image
-                    pass
+                images.attach(post, image_file)
+            post.save()
+            images.schedule(post)
+            logger.info(f"Created post {post.id} by user {user.username}")
 
             return post
             
@@ -248,34 +223,26 @@ class PostUpdateSerializer(serializers.ModelSerializer):
         remove_image = validated_data.pop('remove_image', False)
         
         # Update other fields
+        changed = {'updated_at'}
         for attr, val in validated_data.items():
             if val is not None:
                 setattr(instance, attr, val)
+                changed.add(attr)
         
-        # Handle image operations
-        try:
-            if remove_image:
-                instance.image_url = None
-                logger.info(f"Removed image from post {instance.id}")
-            
-            if image_file:
-                logger.info(f"Updating image for post {instance.id}")
-                ext = 'jpg' if image_file.content_type == 'image/jpeg' else 'png'
-                dest_path = f'posts/{instance.author.id}/post_{instance.id}_{uuid.uuid4().hex}.{ext}'
-                
-                # Try upload
-                public_url = upload_image_to_supabase(image_file, dest_path)
-                if not public_url:
-                    public_url = save_image_locally(image_file, dest_path)
-                
-                if public_url:
-                    instance.image_url = public_url
-                    logger.info(f"Updated image for post {instance.id}: {public_url}")
-                
-        except Exception as e:
-            logger.error(f"Image update failed for post {instance.id}: {e}")
-            # Continue without failing the update
-            pass
-        
-        instance.save()
+        # Handle image operations; the current image stays until the new one is processed
+        released = None
+        if remove_image:
+            released = images.clear(instance)
+            changed.update(images.CLEAR_FIELDS)
+            logger.info(f"Removed image from post {instance.id}")
+        if image_file:
+            images.attach(instance, image_file)
+            changed.update(images.ATTACH_FIELDS)
+            logger.info(f"Queued image update for post {instance.id}")
+
+        # only what this request changed, so a concurrent image worker's
+        # result and the counter columns are not overwritten
+        instance.save(update_fields=changed)
+        images.release(released)
+        images.schedule(instance)
         return instance
\ No newline at end of file
@@ -0,0 +1,23 @@
+# posts/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import images, search
+from .models import Post
+
+SEARCH_FIELDS = {'content', 'is_active'}
+
+
+@receiver(post_delete, sender=Post)
+def release_image_blob(sender, instance, **kwargs):
+    if instance.image_job:
+        images.discard(instance.image_job)
+    images.release(instance.image_blob_id)
+
+
+@receiver(post_save, sender=Post)
+def index_post_for_search(sender, instance, update_fields=None, **kwargs):
+    # saves that only touch other fields leave the index as it is
+    if update_fields is not None and not set(update_fields) & SEARCH_FIELDS:
+        return
+    search.index_post(instance)
@@ -53,85 +53,12 @@ from urllib.parse import urljoin
 from django.core.files.uploadedfile import UploadedFile
 from django.conf import settings
 
-logger = logging.getLogger(__name__)
+from core.storage import StorageError, get_local_storage, get_storage, sniff_image_type
 
-# Check if supabase is available
-try:
-    from supabase import create_client, Client
-    SUPABASE_AVAILABLE = True
-except ImportError:
-    logger.warning("Supabase not installed. Image uploads will be disabled.")
-    SUPABASE_AVAILABLE = False
+logger = logging.getLogger(__name__)
 
-SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 SUPABASE_BUCKET = os.getenv('SUPABASE_BUCKET', 'posts')
 
-def get_supabase_client() -> 'Client':
-    """Get Supabase client with proper error handling"""
-    if not SUPABASE_AVAILABLE:
-        raise RuntimeError('Supabase package is not installed. Run: pip install supabase')
-    
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        raise RuntimeError('SUPABASE_URL and SUPABASE_KEY must be set as environment variables')
-    
-    try:
-        return create_client(SUPABASE_URL, SUPABASE_KEY)
-    except Exception as e:
-        logger.error(f"Failed to create Supabase client: {e}")
-        raise RuntimeError(f"Failed to connect to Supabase: {e}")
-
-def upload_image_to_supabase(file_obj: UploadedFile, dest_path: str) -> str:
-    """
-    Uploads the file_obj (Django UploadedFile) to Supabase and returns a public URL.
-    Returns None if upload fails to allow posts without images.
-    """
-    try:
-        # Validate file first
-        if not validate_image_file(file_obj):
-            raise ValueError("Invalid image file")
-        
-        logger.info(f"Attempting to upload image to Supabase: {dest_path}")
-        
-        client = get_supabase_client()
-        content = file_obj.read()
-        
-        # Reset file pointer after reading
-        file_obj.seek(0)
-        
-        # Upload file
-        logger.info(f"Uploading to bucket: {SUPABASE_BUCKET}, path: {dest_path}")
-        
-        upload_response = client.storage.from_(SUPABASE_BUCKET).upload(
-            dest_path, 
-            content, 
-            {'content-type': file_obj.content_type}
-        )
-        
-        logger.info(f"Upload response: {upload_response}")
-        
-        # Get public URL
-        public_url_response = client.storage.from_(SUPABASE_BUCKET).get_public_url(dest_path)
-        
-        if isinstance(public_url_response, dict) and 'publicURL' in public_url_response:
-            public_url = public_url_response['publicURL']
-        else:
-            # Fallback URL construction
-            public_url = f"{SUPABASE_URL}/storage/v1/object/public/{SUPABASE_BUCKET}/{dest_path}"
-        
-        logger.info(f"Generated public URL: {public_url}")
-        return public_url
-        
-    except Exception as e:
-        logger.error(f"Failed to upload image to Supabase: {e}")
-        logger.error(f"Error type: {type(e).__name__}")
-        logger.error(f"SUPABASE_URL: {SUPABASE_URL}")
-        logger.error(f"SUPABASE_KEY: {'Set' if SUPABASE_KEY else 'Not set'}")
-        
-        # Don't raise the error - allow posts without images
-        # You can change this behavior if you want uploads to be mandatory
-        return None
-
 def validate_image_file(file_obj: UploadedFile) -> bool:
     """Validate image file size and type"""
     try:
@@ -141,11 +68,13 @@ def validate_image_file(file_obj: UploadedFile) -> bool:
             logger.error(f"File too large: {file_obj.size} bytes (max: {max_size})")
             return False
 
-        # Validate content type
-        allowed_types = ('image/jpeg', 'image/png', 'image/jpg')
-        if not hasattr(file_obj, 'content_type') or file_obj.content_type not in allowed_types:
-            logger.error(f"Invalid content type: {getattr(file_obj, 'content_type', 'Unknown')}")
+        # Validate the actual type from the magic bytes, not the client's content_type
+        allowed_types = ('image/jpeg', 'image/png')
+        detected = sniff_image_type(file_obj)
+        if detected not in allowed_types:
+            logger.error(f"Invalid image type: {detected or 'unknown'} (claimed {getattr(file_obj, 'content_type', 'Unknown')})")
             return False
+        file_obj.content_type = detected
             
         return True
         
@@ -153,32 +82,36 @@ def validate_image_file(file_obj: UploadedFile) -> bool:
         logger.error(f"Error validating file: {e}")
         return False
 
-# Alternative: Local file storage fallback
-def save_image_locally(file_obj: UploadedFile, dest_path: str) -> str:
+def upload_bytes_to_supabase(content: bytes, dest_path: str, content_type: str) -> str:
     """
-    Fallback function to save images locally if Supabase fails
+    Upload already-validated bytes (e.g. a processed image variant). Returns None on failure.
+    Paths are content-addressed, so an existing object is simply overwritten.
     """
     try:
-        import os
-        from django.conf import settings
-        
-        # Create media directory if it doesn't exist
-        media_root = getattr(settings, 'MEDIA_ROOT', 'media')
-        upload_dir = os.path.join(media_root, 'posts')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Save file locally
-        filename = os.path.basename(dest_path)
-        local_path = os.path.join(upload_dir, filename)
-        
-        with open(local_path, 'wb') as f:
-            for chunk in file_obj.chunks():
-                f.write(chunk)
-        
-        # Return relative URL
-        media_url = getattr(settings, 'MEDIA_URL', '/media/')
-        return f"{media_url}posts/{filename}"
-        
-    except Exception as e:
-        logger.error(f"Failed to save image locally: {e}")
-        return None
\ No newline at end of file
+        return get_storage().upload(SUPABASE_BUCKET, dest_path, content, content_type, upsert=True)
+    except StorageError as e:
+        logger.error(f"Failed to upload {dest_path}: {e}")
+        return None
+
+
+def save_bytes_locally(content: bytes, dest_path: str) -> str:
+    """Write bytes to local media storage and return the media URL, or None on failure."""
+    try:
+        return get_local_storage().upload(SUPABASE_BUCKET, dest_path, content, None, upsert=True)
+    except StorageError as e:
+        logger.error(f"Failed to save {dest_path} locally: {e}")
+        return None
+
+
+def store_image_bytes(content: bytes, dest_path: str, content_type: str) -> str:
+    """Configured storage first, local media storage as the fallback."""
+    return upload_bytes_to_supabase(content, dest_path, content_type) or save_bytes_locally(content, dest_path)
+
+
+def delete_image_objects(paths) -> None:
+    """Remove objects from the configured storage and the local fallback."""
+    for storage in {get_storage(), get_local_storage()}:
+        try:
+            storage.delete(SUPABASE_BUCKET, paths)
+        except StorageError as e:
+            logger.error(f"Failed to delete {len(paths)} images: {e}")
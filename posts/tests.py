@@ -1,3 +1,372 @@
-from django.test import TestCase
+import base64
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core import storage
+from . import counters, images, search
+from .pagination import decode_cursor, encode_cursor
+from .models import ImageBlob, Post, PostTerm
+from .serializers import PostUpdateSerializer
+
+User = get_user_model()
+
+
+def image_file(name='photo.jpg', size=(800, 600), color='red', exif=None):
+    fmt = 'PNG' if name.endswith('.png') else 'JPEG'
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, fmt, **({'exif': exif} if exif else {}))
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+class TempMediaMixin:
+    """Local storage and the image spool in a throwaway directory."""
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, True)
+        override = override_settings(
+            MEDIA_ROOT=self.media,
+            IMAGE_SPOOL_DIR=os.path.join(self.media, 'spool'),
+            STORAGE_BACKEND='core.storage.LocalStorage',
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        storage.reset()
+        self.addCleanup(storage.reset)
+
+    def stored(self, url):
+        """Local file behind a storage URL."""
+        return os.path.join(self.media, url.split('/media/', 1)[1])
+
+
+class PostUpdateTests(TestCase):
+    def test_edit_saves_only_changed_fields(self):
+        author = User.objects.create_user('author', 'author@example.com', 'pw')
+        post = Post.objects.create(author=author, content='first')
+        # written meanwhile by the image worker and the counter flush
+        Post.objects.filter(pk=post.pk).update(image_url='https://cdn.example.com/a.webp', like_count=3)
+
+        serializer = PostUpdateSerializer(post, data={'content': 'second'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        post.refresh_from_db()
+        self.assertEqual(post.content, 'second')
+        self.assertEqual(post.image_url, 'https://cdn.example.com/a.webp')
+        self.assertEqual(post.like_count, 3)
+
+
+@override_settings(POST_COUNTER_FLUSH_INTERVAL=60)
+class CounterBufferTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.post = Post.objects.create(author=author, content='hello')
+        self.addCleanup(counters.counter_buffer.flush)
+        self.addCleanup(counters.counter_buffer.worker.stop, 1)
+
+    def test_rolled_back_delta_is_not_counted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    counters.increment(self.post.id, 'like_count')
+                    raise RuntimeError('request failed')
+            except RuntimeError:
+                pass
+            counters.increment(self.post.id, 'like_count')
+        counters.counter_buffer.flush()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_save_leaves_counters_alone(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.increment(self.post.id, 'comment_count')
+        counters.counter_buffer.flush()
+
+        stale.content = 'edited'
+        stale.save()
+
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.content, self.post.comment_count), ('edited', 1))
+
+
+class PostsCountTests(TestCase):
+    def test_deactivation_is_counted_without_rereading_the_post(self):
+        author = User.objects.create_user('author', 'author@example.com', 'pw')
+        Post.objects.create(author=author, content='hello')
+        post = Post.objects.get(author=author)
+
+        post.is_active = False
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        post.save()
+
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT "posts_post"')])
+
+        author.profile.refresh_from_db()
+        self.assertEqual(author.profile.posts_count, 0)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.posts = [Post.objects.create(author=author, content=f'post {i}') for i in range(5)]
+        # ties on created_at are ordered by id
+        Post.objects.update(created_at=timezone.now())
+        self.client = APIClient()
+
+    def test_cursor_walk_sees_every_post_once_without_count(self):
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get('/api/posts/', {'cursor': cursor, 'page_size': 2}).data
+            self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+            self.assertFalse([q for q in queries if 'OFFSET' in q['sql']])
+            seen += [item['id'] for item in data['results']]
+            cursor = data['next_cursor']
+        self.assertEqual(seen, [post.id for post in reversed(self.posts)])
+
+    def test_new_post_does_not_shift_later_pages(self):
+        first = self.client.get('/api/posts/', {'cursor': '', 'page_size': 2}).data
+        Post.objects.create(author=self.posts[0].author, content='newer')
+        second = self.client.get('/api/posts/', {'cursor': first['next_cursor'], 'page_size': 2}).data
+        self.assertEqual([item['id'] for item in second['results']], [self.posts[2].id, self.posts[1].id])
+
+    def test_page_numbers_still_work(self):
+        data = self.client.get('/api/posts/', {'page': 2, 'page_size': 2}).data
+        self.assertEqual(data['count'], 5)
+        self.assertEqual([item['id'] for item in data['results']], [self.posts[2].id, self.posts[1].id])
+
+    def test_bad_cursors_are_404(self):
+        def b64(raw):
+            return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+        for cursor in ['not base64!', b64(b'no separator'), b64(b'2026-01-01T00:00:00|x'),
+                       b64(b'yesterday|1'), b64(b'\xff\xfe|1')]:
+            response = self.client.get('/api/posts/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+            self.assertEqual(response.data['detail'], 'Invalid cursor')
+
+    def test_cursor_round_trip(self):
+        post = self.posts[0]
+        self.assertEqual(decode_cursor(encode_cursor(post.created_at, post.id)), (post.created_at, post.id))
+        self.assertIsNone(decode_cursor(''))
+
+
+class ImagePipelineTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_upload_is_acknowledged_then_processed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/posts/', {'content': 'hi', 'image_file': image_file(size=(2000, 1000))}, format='multipart',
+            )
+            self.assertEqual(response.data['image_status'], Post.IMAGE_PENDING)
+            self.assertIsNone(response.data['image_url'])
+
+        post = Post.objects.get()
+        self.assertEqual(post.image_status, Post.IMAGE_READY)
+        self.assertEqual(post.image_url, post.image_variants['full']['url'])
+        self.assertEqual(post.image_variants['thumbnail']['width'], 160)
+        self.assertEqual(post.image_variants['feed']['height'], 360)
+        for variant in post.image_variants.values():
+            self.assertTrue(os.path.exists(self.stored(variant['url'])))
+            self.assertTrue(variant['webp'].endswith('.webp'))
+        self.assertEqual(os.listdir(images.spool_dir()), [])
+
+    def test_metadata_is_stripped(self):
+        exif = Image.Exif()
+        exif[0x010e] = 'taken at home'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/posts/', {'content': 'hi', 'image_file': image_file(exif=exif)}, format='multipart')
+
+        post = Post.objects.get()
+        with Image.open(self.stored(post.image_variants['full']['url'])) as stored:
+            self.assertNotIn('exif', stored.info)
+
+    def test_replaced_job_is_not_applied(self):
+        post = Post(author=self.author, content='hi')
+        images.attach(post, image_file(color='red'))
+        post.save()
+        old_job = post.image_job
+        images.attach(post, image_file(color='blue'))
+        post.save()
+
+        self.assertFalse(images.process(post.id, old_job))
+        with self.captureOnCommitCallbacks(execute=True):
+            images.schedule(post)
+        post.refresh_from_db()
+        self.assertEqual((post.image_status, post.image_job), (Post.IMAGE_READY, ''))
+
+    def test_undecodable_image_fails_the_post(self):
+        post = Post(author=self.author, content='hi')
+        images.attach(post, SimpleUploadedFile('x.jpg', b'\xff\xd8\xff not really', content_type='image/jpeg'))
+        post.save()
+
+        with self.assertLogs('posts.images', 'ERROR'):
+            self.assertFalse(images.process(post.id, post.image_job))
+        post.refresh_from_db()
+        self.assertEqual((post.image_status, post.image_job, post.image_url), (Post.IMAGE_FAILED, '', None))
+        self.assertEqual(os.listdir(images.spool_dir()), [])
+
+
+class ImageBlobTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('author', 'author@example.com', 'pw')
+
+    def post_with(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post(author=self.author, content='meme')
+            images.attach(post, upload)
+            post.save()
+            images.schedule(post)
+        post.refresh_from_db()
+        return post
+
+    def delete(self, post):
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+
+    def test_identical_uploads_share_one_blob_until_the_last_post_goes(self):
+        first = self.post_with(image_file())
+        with mock.patch.object(images, 'build_variants') as build:
+            second = self.post_with(image_file())
+        build.assert_not_called()
+        self.assertEqual(first.image_variants, second.image_variants)
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+
+        self.delete(first)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(self.stored(second.image_url)))
+
+        self.delete(second)
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(os.path.exists(self.stored(second.image_url)))
+
+    def test_removing_an_image_releases_its_blob(self):
+        post = self.post_with(image_file())
+        with self.captureOnCommitCallbacks(execute=True):
+            images.release(images.clear(post))
+            post.save(update_fields=images.CLEAR_FIELDS)
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_acquire_during_collect_keeps_the_blob(self):
+        post = self.post_with(image_file())
+        digest = post.image_blob_id
+        # the last reference went, but collect() has not run yet
+        Post.objects.filter(pk=post.pk).update(image_blob=None)
+        ImageBlob.objects.update(ref_count=0)
+
+        real_filter = ImageBlob.objects.filter
+
+        def acquire_while_collecting(*args, **kwargs):
+            rows = real_filter(*args, **kwargs)
+            if kwargs == {'ref_count': 0}:
+                # collect() has read its candidates; a new post takes a reference
+                rows = list(rows)
+                images.acquire(digest, None, 'jpg')
+            return rows
+
+        with mock.patch.object(ImageBlob.objects, 'filter', acquire_while_collecting):
+            self.assertEqual(images.collect(), 0)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(self.stored(post.image_url)))
+
+    def test_zero_count_blob_still_in_use_is_kept(self):
+        post = self.post_with(image_file())
+        ImageBlob.objects.update(ref_count=0)
+
+        with self.assertLogs('posts.images', 'WARNING'):
+            self.assertEqual(images.collect(), 0)
+        self.assertTrue(ImageBlob.objects.filter(digest=post.image_blob_id).exists())
+
+
+class PostSearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.client = APIClient()
+
+    def post(self, content, **fields):
+        return Post.objects.create(author=self.author, content=content, **fields)
+
+    def ids(self, url, **params):
+        return [item['id'] for item in self.client.get(url, params).data['results']]
+
+    def test_tokenize(self):
+        terms = search.tokenize('Loving #Python with @Bob, mail me at bob@example.com')
+        self.assertEqual(terms['#python'], (PostTerm.KIND_HASHTAG, 3))
+        self.assertEqual(terms['python'], (PostTerm.KIND_WORD, 2))
+        self.assertEqual(terms['@bob'], (PostTerm.KIND_MENTION, 2))
+        self.assertEqual(terms['loving'], (PostTerm.KIND_WORD, 1))
+        # "with" is a stopword and the address is not a mention of example
+        self.assertNotIn('with', terms)
+        self.assertNotIn('@example', terms)
+
+    def test_ranking_and_exact_tags(self):
+        plain = self.post('python tips')
+        tagged = self.post('tips for #python')
+        other = self.post('gardening tips')
+
+        # matching more terms, and tagging them, ranks first
+        self.assertEqual(self.ids('/api/posts/search/', q='python tips'), [tagged.id, plain.id, other.id])
+        self.assertEqual(self.ids('/api/posts/search/', q='#python'), [tagged.id])
+        self.assertEqual(self.ids('/api/posts/search/', q='the'), [])
+
+    def test_index_follows_edits_and_soft_deletes(self):
+        post = self.post('old words')
+        post.content = 'new words'
+        post.save()
+        self.assertEqual(self.ids('/api/posts/search/', q='old'), [])
+        self.assertEqual(self.ids('/api/posts/search/', q='new'), [post.id])
+
+        post.is_active = False
+        post.save(update_fields=['is_active'])
+        self.assertFalse(PostTerm.objects.filter(post=post).exists())
+        post.is_active = True
+        post.save(update_fields=['is_active'])
+        self.assertEqual(self.ids('/api/posts/search/', q='new'), [post.id])
+
+    def test_search_pages_by_cursor(self):
+        posts = [self.post(content) for content in ('python', '#python', 'python again', 'about @python')]
+        seen, cursor = [], ''
+        while cursor is not None:
+            data = self.client.get('/api/posts/search/', {'q': 'python', 'cursor': cursor, 'page_size': 1}).data
+            seen += [item['id'] for item in data['results']]
+            cursor = data['next_cursor']
+        # tagged or mentioned first, then plain words; newest first within a rank
+        self.assertEqual(seen, [posts[3].id, posts[1].id, posts[2].id, posts[0].id])
+        response = self.client.get('/api/posts/search/', {'q': 'python', 'cursor': 'bogus'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_hashtag_page(self):
+        older = self.post('first #Django post')
+        newer = self.post('second #django post')
+        self.post('about django without the tag')
+        self.post('hidden #django', is_active=False)
+
+        self.assertEqual(self.ids('/api/posts/hashtags/DJANGO/'), [newer.id, older.id])
+        data = self.client.get('/api/posts/hashtags/django/', {'page_size': 1}).data
+        self.assertEqual([item['id'] for item in data['results']], [newer.id])
+        data = self.client.get('/api/posts/hashtags/django/', {'page_size': 1, 'cursor': data['next_cursor']}).data
+        self.assertEqual(([item['id'] for item in data['results']], data['has_next']), ([older.id], False))
@@ -1,8 +1,10 @@
 # posts/urls.py
 from django.urls import path
-from .views import PostListCreateView, PostRetrieveUpdateDestroyView
+from .views import PostListCreateView, PostRetrieveUpdateDestroyView, PostSearchView, HashtagPostListView
 
 urlpatterns = [
     path('', PostListCreateView.as_view(), name='post-list-create'),            # POST /api/posts/  GET /api/posts/
+    path('search/', PostSearchView.as_view(), name='post-search'),                # GET /api/posts/search/?q=
+    path('hashtags/<str:tag>/', HashtagPostListView.as_view(), name='post-hashtag'),  # GET /api/posts/hashtags/{tag}/
     path('<int:id>/', PostRetrieveUpdateDestroyView.as_view(), name='post-detail'), # GET/PUT/PATCH/DELETE /api/posts/{id}/
 ]
@@ -1,9 +1,10 @@
 # posts/views.py
 from rest_framework import generics, permissions
-from .models import Post
+from .models import Post, PostTerm
 from .serializers import PostListSerializer, PostCreateSerializer, PostUpdateSerializer
 from .permissions import IsOwnerOrReadOnly
-from rest_framework.pagination import PageNumberPagination
+from .pagination import KeysetPagination, RankedKeysetPagination
+from . import search
 from rest_framework.generics import CreateAPIView
 
 import logging
@@ -19,13 +20,13 @@ class PostCreateView(CreateAPIView):
 
 
 
-class StandardResultsSetPagination(PageNumberPagination):
+class StandardResultsSetPagination(KeysetPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 50
 
 class PostListCreateView(generics.ListCreateAPIView):
-    queryset = Post.objects.filter(is_active=True).select_related('author')
+    queryset = Post.objects.filter(is_active=True).select_related('author__profile')
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     pagination_class = StandardResultsSetPagination
 
@@ -38,7 +39,7 @@ class PostListCreateView(generics.ListCreateAPIView):
         serializer.save(author=self.request.user)
 
 class PostRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Post.objects.all().select_related('author')
+    queryset = Post.objects.all().select_related('author__profile')
     permission_classes = [IsOwnerOrReadOnly]
     lookup_field = 'id'
 
@@ -46,3 +47,51 @@ class PostRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         if self.request.method in ('PUT', 'PATCH'):
             return PostUpdateSerializer
         return PostListSerializer
+
+
+class SearchResultsPagination(RankedKeysetPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    rank_field = 'search_rank'
+
+
+class PostSearchView(generics.ListAPIView):
+    """
+    GET /api/posts/search/?q=<text>
+    Ranked search over the post index (posts/search.py), paged by ?cursor=.
+    """
+    serializer_class = PostListSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = SearchResultsPagination
+
+    def get_queryset(self):
+        q = self.request.query_params.get('q', '')
+        qs = Post.objects.filter(is_active=True).select_related('author__profile')
+        return search.search(qs, q)
+
+
+class HashtagPagination(StandardResultsSetPagination):
+    keyset_only = True
+    # page through the index rows' copy of created_at, in index order
+    pk_field = 'post_id'
+
+
+class HashtagPostListView(generics.ListAPIView):
+    """
+    GET /api/posts/hashtags/<tag>/
+    Newest posts tagged #<tag>, paged by ?cursor=.
+    """
+    serializer_class = PostListSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = HashtagPagination
+
+    def get_queryset(self):
+        return PostTerm.objects.filter(
+            term=search.hashtag(self.kwargs['tag'])
+        ).select_related('post__author__profile')
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer([term.post for term in page], many=True)
+        return self.get_paginated_response(serializer.data)
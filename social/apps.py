@@ -5,6 +5,5 @@ class SocialConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'social'
 
-
-def ready(self):
-    import social.signals
+    def ready(self):
+        import social.signals  # noqa
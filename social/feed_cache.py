@@ -0,0 +1,180 @@
+# social/feed_cache.py
+"""
+Cached home feed pages.
+
+The first FEED_CACHE_PAGES pages of each user's feed (page-number or
+cursor mode) are cached as rendered payloads in the FEED_CACHE_ALIAS cache
+(locmem/file for one node, a shared backend for a cluster), keyed by user,
+a per-user version token and the page or cursor. Stale pages are never
+read again and age out after FEED_CACHE_TTL.
+
+Two kinds of version keep pages fresh without walking follower lists on
+every post save:
+
+- the viewer's version is dropped when they follow or unfollow, and by
+  timeline fan-out for each follower it pushed a new post to;
+- each author has a version too, bumped in O(1) when one of their posts is
+  edited, deleted or gets its processed image, and when a pull author
+  posts. A cached page records the versions of the authors on it and of
+  the pull authors the viewer follows, and is a miss once any has moved.
+
+Both are read before the page is built: the viewer's when FeedPageCache is
+created, the authors' by the caller (every author the viewer follows, as
+the page's authors are not known yet) and passed to set(). A change made
+while the page is being built then leaves it already stale instead of
+recording it as current.
+
+is_liked is not part of a cached page. It is overlaid per request from a
+small per-viewer cache of post ID -> liked, which the Like signals drop,
+so liking a post does not throw away the viewer's pages.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Follow, Like
+
+
+def get_cache():
+    return caches[getattr(settings, 'FEED_CACHE_ALIAS', 'default')]
+
+
+def ttl():
+    return getattr(settings, 'FEED_CACHE_TTL', 60)
+
+
+def max_pages():
+    return getattr(settings, 'FEED_CACHE_PAGES', 3)
+
+
+def _version_key(user_id):
+    return f'feed:ver:{user_id}'
+
+
+def _likes_key(user_id):
+    return f'feed:liked:{user_id}'
+
+
+def _author_key(author_id):
+    return f'feed:author:{author_id}'
+
+
+def author_versions(author_ids):
+    """{author_id: version} for the given authors, starting versions where missing."""
+    cache = get_cache()
+    keys = {_author_key(author_id): author_id for author_id in author_ids}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex[:12], None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump_author(author_id):
+    """Invalidate every cached page showing (or pulling) this author's posts."""
+    get_cache().set(_author_key(author_id), uuid.uuid4().hex[:12], None)
+
+
+class FeedPageCache:
+    """Cached pages of one user's feed under their current version."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.cache = get_cache()
+        key = _version_key(user_id)
+        self.version = self.cache.get(key)
+        if self.version is None:
+            self.cache.add(key, uuid.uuid4().hex[:12], None)
+            self.version = self.cache.get(key)
+
+    def _key(self, kind, page):
+        return f'feed:{kind}:{self.user_id}:{self.version}:{page}'
+
+    def depth(self, page):
+        """0-based depth of a page ('page:<n>' or 'cursor:<c>'), or None if unknown."""
+        kind, _, value = page.partition(':')
+        if kind == 'page':
+            try:
+                return int(value) - 1
+            except ValueError:
+                return None
+        if not value:
+            return 0
+        return self.cache.get(self._key('depth', value))
+
+    def cacheable(self, page):
+        depth = self.depth(page)
+        return depth is not None and 0 <= depth < max_pages()
+
+    def get(self, page):
+        if not self.cacheable(page):
+            return None
+        entry = self.cache.get(self._key('page', page))
+        if entry is None:
+            return None
+        versions = entry['authors']
+        current = self.cache.get_many([_author_key(author_id) for author_id in versions])
+        if any(current.get(_author_key(author_id)) != version for author_id, version in versions.items()):
+            return None
+        return entry['payload']
+
+    def set(self, page, payload, author_ids, versions):
+        """
+        Cache a page; `author_ids` are the authors whose changes make it
+        stale and `versions` their author_versions() from before the build.
+        """
+        if not self.cacheable(page) or not versions.keys() >= author_ids:
+            # an author the snapshot missed, e.g. from a stale follow set
+            return
+        authors = {author_id: versions[author_id] for author_id in author_ids}
+        entries = {self._key('page', page): {'payload': payload, 'authors': authors}}
+        next_cursor = payload.get('next_cursor')
+        if next_cursor:
+            # remember how deep the next cursor is, so its page is cached too
+            entries[self._key('depth', next_cursor)] = self.depth(page) + 1
+        self.cache.set_many(entries, ttl())
+
+
+def invalidate_viewers(user_ids):
+    user_ids = list(user_ids)
+    if user_ids:
+        get_cache().delete_many([_version_key(user_id) for user_id in user_ids])
+
+
+def invalidate_author(author_id, batch_size=1000):
+    """
+    Drop the cached feeds of everyone following `author_id`. One query per
+    batch of followers; bump_author() covers ordinary post changes.
+    """
+    batch = []
+    for follower_id in Follow.objects.filter(following_id=author_id) \
+            .values_list('follower_id', flat=True).iterator(chunk_size=batch_size):
+        batch.append(follower_id)
+        if len(batch) >= batch_size:
+            invalidate_viewers(batch)
+            batch = []
+    invalidate_viewers(batch)
+
+
+def liked_ids(user_id, post_ids):
+    """The subset of post_ids the user has liked, from the cache where possible."""
+    cache = get_cache()
+    known = cache.get(_likes_key(user_id)) or {}
+    missing = [post_id for post_id in post_ids if post_id not in known]
+    if missing:
+        liked = set(Like.objects.filter(user_id=user_id, post_id__in=missing)
+                    .values_list('post_id', flat=True))
+        known.update({post_id: post_id in liked for post_id in missing})
+        limit = getattr(settings, 'FEED_LIKED_CACHE_SIZE', 500)
+        if len(known) > limit:
+            # keep the most recently checked entries
+            known = dict(list(known.items())[-limit:])
+        cache.set(_likes_key(user_id), known, getattr(settings, 'FEED_LIKED_CACHE_TTL', 600))
+    return {post_id for post_id in post_ids if known[post_id]}
+
+
+def forget_likes(user_id):
+    get_cache().delete(_likes_key(user_id))
@@ -0,0 +1,49 @@
+# social/follow_cache.py
+"""
+Cached per-user follow sets.
+
+Each user's followed IDs are kept in the cache as a sorted array of 64-bit
+ints (8 bytes per edge), so membership is a binary search in memory rather
+than a query. Entries are dropped by the Follow signal handlers whenever
+the user follows or unfollows someone, but only in the cache this process
+sees, so with a per-process cache another process may answer from a stale
+set until FOLLOW_CACHE_TTL runs out. Use it for display hints such as
+follow buttons; access checks query Follow directly.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow
+
+
+def _key(user_id):
+    return f'follows:out:{user_id}'
+
+
+def following_ids(user_id):
+    """Sorted array('q') of the IDs `user_id` follows."""
+    raw = cache.get(_key(user_id))
+    ids = array('q')
+    if raw is None:
+        ids.extend(sorted(
+            Follow.objects.filter(follower_id=user_id).values_list('following_id', flat=True)
+        ))
+        cache.set(_key(user_id), ids.tobytes(), getattr(settings, 'FOLLOW_CACHE_TTL', 300))
+    else:
+        ids.frombytes(raw)
+    return ids
+
+
+def is_following(follower_id, following_id, ids=None):
+    """Pass `ids` from following_ids() to check many users against one lookup."""
+    if ids is None:
+        ids = following_ids(follower_id)
+    i = bisect_left(ids, following_id)
+    return i < len(ids) and ids[i] == following_id
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id))
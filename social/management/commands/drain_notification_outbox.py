@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from social import outbox
+
+
+class Command(BaseCommand):
+    help = "Ship queued notifications to the Supabase mirror"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep draining until interrupted')
+        parser.add_argument('--interval', type=float, default=5.0)
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if not outbox.is_enabled():
+            self.stderr.write("Notification mirror is not configured")
+            return
+        while True:
+            sent = outbox.drain(options['batch_size'])
+            if sent:
+                self.stdout.write(f"Shipped {sent} notifications")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
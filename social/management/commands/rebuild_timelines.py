@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from social.timeline import rebuild_timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home timelines from the follow graph"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only rebuild these user IDs (repeatable)')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids'] or User.objects.values_list('id', flat=True)
+        total = 0
+        for user_id in user_ids:
+            total += rebuild_timeline(user_id)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt timelines with {total} entries"))
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_posts_created_id_idx'),
+        ('social', '0003_timeline'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created_at', 'id'], name='social_comment_post_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Merges the accounts.User.followers M2M edges into social.Follow so there
+# is a single follow store, and indexes both directions of it.
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def merge_follow_edges(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Follow = apps.get_model('social', 'Follow')
+    Profile = apps.get_model('accounts', 'Profile')
+
+    # through rows: from_user is followed by to_user
+    edges = User.followers.through.objects.values_list('to_user_id', 'from_user_id')
+    Follow.objects.bulk_create(
+        [Follow(follower_id=follower_id, following_id=following_id)
+         for follower_id, following_id in edges.iterator()
+         if follower_id != following_id],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+    def count(field):
+        return Coalesce(Subquery(
+            Follow.objects.filter(**{field: OuterRef('user_id')})
+            .order_by().values(field).annotate(c=Count('id')).values('c')
+        ), 0)
+
+    Profile.objects.update(
+        followers_count=count('following_id'),
+        following_count=count('follower_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_profile_counters'),
+        ('social', '0004_comment_social_comment_post_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['follower', '-created_at'], name='social_follow_follower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['following', '-created_at'], name='social_follow_following_idx'),
+        ),
+        migrations.RunPython(merge_follow_edges, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_pull_authors(apps, schema_editor):
+    # authors already past the limit were pulled all along; dating them from
+    # their signup lets a later switch back to push backfill their posts
+    Profile = apps.get_model('accounts', 'Profile')
+    PullAuthor = apps.get_model('social', 'PullAuthor')
+    limit = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 5000)
+    PullAuthor.objects.bulk_create([
+        PullAuthor(author_id=user_id, since=date_joined)
+        for user_id, date_joined in Profile.objects.filter(followers_count__gt=limit)
+        .values_list('user_id', 'user__date_joined')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_email_outbox_claims'),
+        ('social', '0008_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PullAuthor',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('since', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(seed_pull_authors, migrations.RunPython.noop),
+    ]
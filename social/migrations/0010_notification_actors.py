@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_actors(apps, schema_editor):
+    # only the sampled actor_ids are known for existing rows
+    Notification = apps.get_model('social', 'Notification')
+    NotificationActor = apps.get_model('social', 'NotificationActor')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    batch = []
+    for notification_id, sender_id, actor_ids in Notification.objects.values_list('id', 'sender_id', 'actor_ids').iterator():
+        for actor_id in set(actor_ids or [sender_id]):
+            batch.append(NotificationActor(notification_id=notification_id, actor_id=actor_id))
+        if len(batch) >= 1000:
+            _insert(User, NotificationActor, batch)
+            batch = []
+    _insert(User, NotificationActor, batch)
+
+
+def _insert(User, NotificationActor, batch):
+    existing = set(User.objects.filter(id__in={row.actor_id for row in batch}).values_list('id', flat=True))
+    NotificationActor.objects.bulk_create(
+        [row for row in batch if row.actor_id in existing], ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0009_pull_author'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actors', to='social.notification')),
+            ],
+            options={
+                'unique_together': {('notification', 'actor')},
+            },
+        ),
+        migrations.RunPython(backfill_actors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def park_exhausted(apps, schema_editor):
+    NotificationOutbox = apps.get_model('social', 'NotificationOutbox')
+    max_attempts = getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 10)
+    NotificationOutbox.objects.filter(attempts__gte=max_attempts).update(status='parked')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0010_notification_actors'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notificationoutbox',
+            name='social_outbox_due_idx',
+        ),
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('parked', 'Parked')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='notificationoutbox',
+            index=models.Index(fields=['status', 'next_attempt_at', 'id'], name='social_outbox_due_idx'),
+        ),
+        migrations.RunPython(park_exhausted, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-17 19:02
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import migrations
+
+
+def backfill_timelines(apps, schema_editor):
+    # timelines only fill on new follows and posts, so without this every
+    # existing user would start from an empty feed; pull authors are read
+    # at request time and need nothing
+    Follow = apps.get_model('social', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    PullAuthor = apps.get_model('social', 'PullAuthor')
+    TimelineEntry = apps.get_model('social', 'TimelineEntry')
+    size = getattr(settings, 'TIMELINE_BACKFILL_SIZE', 200)
+
+    author_ids = (
+        Follow.objects.exclude(following_id__in=PullAuthor.objects.values('author_id'))
+        .values_list('following_id', flat=True).distinct().order_by()
+    )
+    for author_id in list(author_ids):
+        recent = list(
+            Post.objects.filter(author_id=author_id, is_active=True)
+            .order_by('-created_at')
+            .values_list('id', 'created_at')[:size]
+        )
+        if not recent:
+            continue
+        follower_ids = (
+            Follow.objects.filter(following_id=author_id)
+            .values_list('follower_id', flat=True)
+            .iterator(chunk_size=1000)
+        )
+        while batch := list(islice(follower_ids, 1000 // len(recent) or 1)):
+            TimelineEntry.objects.bulk_create([
+                TimelineEntry(owner_id=follower_id, post_id=post_id, author_id=author_id, created_at=created_at)
+                for follower_id in batch
+                for post_id, created_at in recent
+            ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_post_term'),
+        ('social', '0011_outbox_claims'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0012_backfill_timelines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RedeemedStreamTicket',
+            fields=[
+                ('nonce', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+from core.workers import OUTBOX_PENDING, OUTBOX_STATUS_CHOICES
 
 
 User = settings.AUTH_USER_MODEL
@@ -11,6 +14,10 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ('follower', 'following')
+        indexes = [
+            models.Index(fields=['follower', '-created_at'], name='social_follow_follower_idx'),
+            models.Index(fields=['following', '-created_at'], name='social_follow_following_idx'),
+        ]
 
     def __str__(self):
         return f"{self.follower} follows {self.following}"
@@ -35,6 +42,11 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='social_comment_post_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.author} on {self.post}"
 
@@ -69,8 +81,104 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # coalesced notifications ("alice and 241 others liked your post"):
+    # how many distinct actors there are (counted from NotificationActor)
+    # and the most recent actor IDs, newest first
+    actor_count = models.PositiveIntegerField(default=1)
+    actor_ids = models.JSONField(default=list, blank=True)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'post', 'notification_type'], name='social_notif_coalesce_idx'),
+            models.Index(fields=['recipient', 'is_read', '-created_at'], name='social_notif_inbox_idx'),
+        ]
 
     def __str__(self):
         return f"{self.notification_type} from {self.sender} to {self.recipient}"
+
+
+class NotificationActor(models.Model):
+    """Each distinct user behind a notification, so actor_count is exact."""
+    notification = models.ForeignKey(Notification, related_name='actors', on_delete=models.CASCADE)
+    actor = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('notification', 'actor')
+
+    def __str__(self):
+        return f"{self.actor_id} on notification {self.notification_id}"
+
+
+class TimelineEntry(models.Model):
+    """
+    One row per (follower, post) pushed at write time, so a home feed page is
+    a range read on (owner, created_at) instead of a join over every followed
+    author. created_at is copied from the post to keep that read index-only.
+    """
+    owner = models.ForeignKey(User, related_name='timeline_entries', on_delete=models.CASCADE)
+    post = models.ForeignKey('posts.Post', related_name='timeline_entries', on_delete=models.CASCADE)
+    author = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='social_timeline_owner_idx'),
+            models.Index(fields=['owner', 'author'], name='social_timeline_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} in timeline of {self.owner_id}"
+
+
+class PullAuthor(models.Model):
+    """
+    An author whose posts are pulled into feeds at read time instead of
+    being fanned out, because they have more than TIMELINE_FANOUT_LIMIT
+    followers. `since` is when they switched, so switching back knows which
+    posts never reached follower timelines. See social/timeline.py.
+    """
+    author = models.OneToOneField(User, primary_key=True, related_name='+', on_delete=models.CASCADE)
+    since = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.author_id} pulled since {self.since:%Y-%m-%d}"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Notifications waiting to be mirrored to Supabase. Rows are written in the
+    same transaction as the notifications and deleted once shipped, or
+    parked after too many failed attempts; see social/outbox.py.
+    """
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=10, choices=OUTBOX_STATUS_CHOICES, default=OUTBOX_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # lease token of the drainer currently sending the row
+    claimed_by = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at', 'id'], name='social_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Outbox {self.id} ({self.attempts} attempts)"
+
+
+class RedeemedStreamTicket(models.Model):
+    """
+    Nonce of a notification stream ticket that has been used, kept until
+    the ticket would have expired anyway. In the database rather than the
+    cache so a ticket works once across every process; see
+    social/streaming.py.
+    """
+    nonce = models.CharField(max_length=32, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Stream ticket {self.nonce}"
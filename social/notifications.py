@@ -0,0 +1,310 @@
+# social/notifications.py
+"""
+Asynchronous notification writes.
+
+Signal handlers enqueue a lightweight event (type plus IDs) once the
+triggering transaction commits. A daemon thread drains the queue every
+NOTIFICATION_FLUSH_INTERVAL seconds, resolves post authors and usernames
+for the whole batch in two queries and writes the rows with a single
+bulk_create. An interval of 0 writes each event synchronously. Events whose
+post, sender or recipient no longer exists are dropped. If a batch fails,
+its events are retried one at a time, so one bad event cannot hold up the
+rest, and an event that fails NOTIFICATION_MAX_ATTEMPTS flushes is logged
+and dropped.
+
+With NOTIFICATION_COALESCE_WINDOW set, events of a coalescable type for the
+same recipient and post are merged into one row ("alice and 241 others
+liked your post") while that row is unread and younger than the window.
+Every actor of a row is recorded in NotificationActor, and the count of a
+merged row is taken from there, so someone who likes, unlikes and likes
+again is counted once however long ago they dropped out of actor_ids.
+"""
+import atexit
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from core.workers import PeriodicWorker
+from posts.models import Post
+from . import outbox, pubsub
+from .models import Notification, NotificationActor
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+MESSAGES = {
+    'follow': "{actors} started following you",
+    'like': "{actors} liked your post",
+    'comment': "{actors} commented on your post",
+}
+
+
+def render_message(notification_type, username, actor_count=1):
+    actors = username
+    if actor_count == 2:
+        actors = f"{username} and 1 other"
+    elif actor_count > 2:
+        actors = f"{username} and {actor_count - 1} others"
+    return MESSAGES[notification_type].format(actors=actors)
+
+
+@dataclass
+class NotificationEvent:
+    notification_type: str
+    sender_id: int
+    recipient_id: Optional[int] = None  # resolved from post_id when missing
+    post_id: Optional[int] = None
+    attempts: int = 0
+
+
+def build_notifications(events):
+    """
+    Turn queued events into unsaved Notification rows, dropping
+    self-notifications and events whose post or users are gone.
+    """
+    post_ids = {e.post_id for e in events if e.post_id}
+    authors = dict(Post.objects.filter(id__in=post_ids).values_list('id', 'author_id')) if post_ids else {}
+    events = [e for e in events if not e.post_id or e.post_id in authors]
+    for event in events:
+        if event.recipient_id is None:
+            event.recipient_id = authors.get(event.post_id)
+    events = [e for e in events if e.recipient_id and e.recipient_id != e.sender_id]
+
+    user_ids = {e.sender_id for e in events} | {e.recipient_id for e in events}
+    usernames = dict(User.objects.filter(id__in=user_ids).values_list('id', 'username')) if user_ids else {}
+    notifications = []
+    for event in events:
+        if event.sender_id not in usernames or event.recipient_id not in usernames:
+            continue
+        notification = Notification(
+            recipient_id=event.recipient_id,
+            sender_id=event.sender_id,
+            notification_type=event.notification_type,
+            post_id=event.post_id,
+            message=render_message(event.notification_type, usernames[event.sender_id]),
+            actor_ids=[event.sender_id],
+        )
+        notification.sender_username = usernames[event.sender_id]
+        notification.new_actor_ids = {event.sender_id}
+        notifications.append(notification)
+    return notifications
+
+
+def _merge(target, newer, sample_size):
+    """Fold `newer` into `target`, keeping the newest actor first."""
+    target.actor_ids = ([newer.sender_id] + [i for i in target.actor_ids if i != newer.sender_id])[:sample_size]
+    target.new_actor_ids |= newer.new_actor_ids
+    target.sender_id = newer.sender_id
+    target.sender_username = newer.sender_username
+
+
+def coalesce(notifications, window):
+    """
+    Merge notifications that share (recipient, type, post) with each other
+    and with recent unread rows. Returns (new rows, updated existing rows).
+    actor_count and message are left to write_notifications().
+    """
+    types = getattr(settings, 'NOTIFICATION_COALESCE_TYPES', ('like', 'comment'))
+    sample_size = getattr(settings, 'NOTIFICATION_ACTOR_SAMPLE', 5)
+    key = lambda n: (n.recipient_id, n.notification_type, n.post_id)
+
+    fresh, passthrough = {}, []
+    for notification in notifications:
+        if notification.notification_type not in types or notification.post_id is None:
+            passthrough.append(notification)
+        elif key(notification) in fresh:
+            _merge(fresh[key(notification)], notification, sample_size)
+        else:
+            fresh[key(notification)] = notification
+    if not fresh:
+        return passthrough, []
+
+    now = timezone.now()
+    existing = {}
+    candidates = Notification.objects.filter(
+        recipient_id__in={k[0] for k in fresh},
+        post_id__in={k[2] for k in fresh},
+        notification_type__in={k[1] for k in fresh},
+        is_read=False,
+        created_at__gte=now - timedelta(seconds=window),
+    ).order_by('created_at')
+    for row in candidates:
+        existing[key(row)] = row  # newest wins
+
+    updated = []
+    for k, notification in list(fresh.items()):
+        row = existing.get(k)
+        if row is None:
+            continue
+        del fresh[k]
+        # fold the older row's actors in behind the new batch
+        row.actor_ids = (notification.actor_ids + [i for i in row.actor_ids if i not in notification.actor_ids])[:sample_size]
+        row.new_actor_ids = notification.new_actor_ids
+        row.sender_id = notification.sender_id
+        row.sender_username = notification.sender_username
+        row.created_at = now  # resurface at the top of the inbox
+        updated.append(row)
+    return passthrough + list(fresh.values()), updated
+
+
+def _record_actors(notifications, updated):
+    """
+    Add this batch's actors to NotificationActor and recount the rows that
+    gained any, re-rendering their messages. Returns the new rows changed.
+    """
+    NotificationActor.objects.bulk_create([
+        NotificationActor(notification_id=notification.id, actor_id=actor_id)
+        for notification in notifications + updated
+        for actor_id in notification.new_actor_ids
+    ], ignore_conflicts=True, batch_size=500)
+
+    merged = updated + [n for n in notifications if len(n.new_actor_ids) > 1]
+    if not merged:
+        return []
+    counts = dict(
+        NotificationActor.objects.filter(notification_id__in=[n.id for n in merged])
+        .order_by().values('notification_id').annotate(c=Count('id')).values_list('notification_id', 'c')
+    )
+    for notification in merged:
+        notification.actor_count = counts.get(notification.id, 1)
+        notification.message = render_message(
+            notification.notification_type, notification.sender_username, notification.actor_count
+        )
+    return [n for n in merged if n not in updated]
+
+
+def write_notifications(events):
+    notifications = build_notifications(events)
+    updated = []
+    window = getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 0)
+    if window:
+        notifications, updated = coalesce(notifications, window)
+    with transaction.atomic():
+        if notifications:
+            Notification.objects.bulk_create(notifications, batch_size=500)
+        recounted = _record_actors(notifications, updated)
+        if recounted:
+            Notification.objects.bulk_update(recounted, ['actor_count', 'message'], batch_size=500)
+        if updated:
+            Notification.objects.bulk_update(
+                updated, ['sender', 'actor_count', 'actor_ids', 'message', 'created_at'], batch_size=500
+            )
+        outbox.record(notifications + updated)
+    # coalesced rows were already unread, so only new rows move the counter
+    for notification in notifications:
+        adjust_unread_count(notification.recipient_id, 1)
+        pubsub.publish(notification.recipient_id, ('unread_count', {'delta': 1}))
+    for notification in notifications + updated:
+        pubsub.publish(notification.recipient_id, ('notification', push_payload(notification)))
+    return notifications + updated
+
+
+def push_payload(notification):
+    """Same shape as NotificationSerializer, built without extra queries."""
+    return {
+        'id': notification.id,
+        'sender_username': notification.sender_username,
+        'notification_type': notification.notification_type,
+        'post': notification.post_id,
+        'message': notification.message,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+        'actor_count': notification.actor_count,
+        'actor_ids': notification.actor_ids,
+    }
+
+
+# ---------- UNREAD COUNTER ----------
+def _unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_count(user_id):
+    """Cached unread count; one indexed COUNT on a miss."""
+    count = cache.get(_unread_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        cache.set(_unread_key(user_id), count, getattr(settings, 'NOTIFICATION_UNREAD_TTL', 300))
+    return count
+
+
+def adjust_unread_count(user_id, delta):
+    # callers publish the delta themselves
+    try:
+        if cache.incr(_unread_key(user_id), delta) < 0:
+            cache.delete(_unread_key(user_id))
+    except ValueError:
+        # not cached; the next read counts from the table
+        pass
+
+
+def reset_unread_count(user_id):
+    cache.set(_unread_key(user_id), 0, getattr(settings, 'NOTIFICATION_UNREAD_TTL', 300))
+    pubsub.publish(user_id, ('unread_count', {'unread_count': 0}))
+
+
+class NotificationQueue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self.worker = PeriodicWorker('notification-writer', self.flush, 'NOTIFICATION_FLUSH_INTERVAL', 1.0)
+
+    @property
+    def interval(self):
+        return self.worker.interval
+
+    def put(self, event):
+        if not self.interval:
+            write_notifications([event])
+            return
+        with self._lock:
+            self._pending.append(event)
+        self.worker.ensure_running()
+
+    def flush(self):
+        """Write everything queued so far. Returns the number of rows written."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        try:
+            return len(write_notifications(pending))
+        except Exception as e:
+            logger.warning(f"Notification flush of {len(pending)} events failed, retrying one by one: {e}")
+
+        written, retry = 0, []
+        max_attempts = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+        for event in pending:
+            try:
+                written += len(write_notifications([event]))
+            except Exception as e:
+                event.attempts += 1
+                if event.attempts >= max_attempts:
+                    logger.error(f"Dropping notification {event} after {event.attempts} attempts: {e}")
+                else:
+                    retry.append(event)
+        if retry:
+            logger.error(f"Requeueing {len(retry)} notification events")
+            with self._lock:
+                self._pending[:0] = retry
+        return written
+
+
+notification_queue = NotificationQueue()
+atexit.register(notification_queue.flush)
+
+
+def enqueue(notification_type, sender_id, recipient_id=None, post_id=None):
+    """Queue a notification to be written after the current transaction commits."""
+    event = NotificationEvent(notification_type, sender_id, recipient_id, post_id)
+    transaction.on_commit(lambda: notification_queue.put(event))
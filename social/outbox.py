@@ -0,0 +1,145 @@
+# social/outbox.py
+"""
+Transactional outbox mirroring notifications to Supabase.
+
+write_notifications() records one NotificationOutbox row per new or
+coalesced notification inside its transaction, replacing any row still
+pending for the same notification. A drainer leases due rows (see
+core/workers.py), ships them in batches as a single PostgREST upsert keyed
+on the notification id over a pooled keep-alive HTTP client, deletes them
+on success and backs off exponentially on failure. Rows still failing
+after NOTIFICATION_OUTBOX_MAX_ATTEMPTS are parked. Nothing here runs at
+import time or on the request path.
+
+The mirror is off unless NOTIFICATION_MIRROR_ENABLED is set and
+NOTIFICATION_MIRROR_URL (default: the Supabase notifications table) and a
+key are configured. The mirror table's
+primary key must be the notification id.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from core.workers import OUTBOX_PENDING, PeriodicWorker, claim_batch, defer_batch
+
+from .models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def mirror_url():
+    url = getattr(settings, 'NOTIFICATION_MIRROR_URL', None)
+    if url:
+        return url
+    if getattr(settings, 'SUPABASE_URL', None):
+        return f"{settings.SUPABASE_URL.rstrip('/')}/rest/v1/notifications"
+    return None
+
+
+def mirror_key():
+    return getattr(settings, 'NOTIFICATION_MIRROR_KEY', None) or getattr(settings, 'SUPABASE_KEY', None)
+
+
+def is_enabled():
+    return bool(getattr(settings, 'NOTIFICATION_MIRROR_ENABLED', False) and mirror_url() and mirror_key())
+
+
+def payload_for(notification):
+    return {
+        "id": notification.id,
+        "recipient_id": notification.recipient_id,
+        "sender_id": notification.sender_id,
+        "notification_type": notification.notification_type,
+        "post_id": notification.post_id,
+        "message": notification.message,
+        "is_read": notification.is_read,
+        "created_at": notification.created_at.isoformat(),
+        "actor_count": notification.actor_count,
+        "actor_ids": notification.actor_ids,
+    }
+
+
+def record(notifications):
+    """Queue new or updated notifications for mirroring. Call inside their transaction."""
+    if not notifications or not is_enabled():
+        return
+    # an unsent older version would only be overwritten by this one
+    NotificationOutbox.objects.filter(
+        status=OUTBOX_PENDING, claimed_by='', payload__id__in=[n.id for n in notifications]
+    ).delete()
+    NotificationOutbox.objects.bulk_create(
+        [NotificationOutbox(payload=payload_for(n)) for n in notifications], batch_size=500
+    )
+    transaction.on_commit(drainer.ensure_running)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Process-wide httpx client, so batches reuse keep-alive connections."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import httpx
+                _client = httpx.Client(
+                    timeout=getattr(settings, 'NOTIFICATION_MIRROR_TIMEOUT', 10),
+                    limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+                )
+    return _client
+
+
+def backoff(attempts):
+    base = getattr(settings, 'NOTIFICATION_OUTBOX_BACKOFF', 5)
+    cap = getattr(settings, 'NOTIFICATION_OUTBOX_BACKOFF_MAX', 3600)
+    return timedelta(seconds=min(cap, base * 2 ** (attempts - 1)))
+
+
+def drain_once(batch_size=None):
+    """Ship one batch of due rows. Returns the number of rows delivered."""
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_OUTBOX_BATCH_SIZE', 200)
+    max_attempts = getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 10)
+    rows = claim_batch(NotificationOutbox.objects.all(), batch_size)
+    if not rows:
+        return 0
+
+    # rows come in id order, so the newest version of a notification wins
+    payloads = {row.payload.get('id', f'row-{row.id}'): row.payload for row in rows}
+    key = mirror_key()
+    try:
+        response = get_http_client().post(
+            mirror_url(),
+            json=list(payloads.values()),
+            headers={
+                'apikey': key,
+                'Authorization': f'Bearer {key}',
+                'Prefer': 'resolution=merge-duplicates,return=minimal',
+            },
+        )
+        response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Notification mirror failed for {len(rows)} rows (attempt {rows[0].attempts + 1}): {e}")
+        defer_batch(rows, e, backoff, max_attempts)
+        return 0
+
+    NotificationOutbox.objects.filter(id__in=[row.id for row in rows], claimed_by=rows[0].claimed_by).delete()
+    return len(rows)
+
+
+def drain(batch_size=None):
+    """Ship batches until nothing is due or a batch fails."""
+    total = 0
+    while True:
+        sent = drain_once(batch_size)
+        total += sent
+        if not sent:
+            return total
+
+
+# 0 leaves draining to the drain_notification_outbox command
+drainer = PeriodicWorker('notification-outbox', drain, 'NOTIFICATION_OUTBOX_INTERVAL', 5.0)
@@ -0,0 +1,76 @@
+# social/pubsub.py
+"""
+Per-user pub/sub used to push notifications to connected clients.
+
+Publishers (the notification writer, the mark-read views) may run in any
+thread; subscribers are asyncio tasks in the ASGI stream. The backend is
+chosen by NOTIFICATION_PUBSUB_BACKEND and must provide publish(user_id,
+message) and an async context manager subscribe(user_id) yielding an
+asyncio.Queue. LocalBroker only reaches subscribers in the same process;
+multi-node deployments swap in a backend that relays through a shared bus.
+"""
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, user_id, message):
+        with self._lock:
+            targets = list(self._subscribers.get(user_id, ()))
+        for loop, queue in targets:
+            loop.call_soon_threadsafe(self._deliver, queue, message)
+
+    @staticmethod
+    def _deliver(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning("Dropping push message for a slow subscriber")
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        entry = (asyncio.get_running_loop(), asyncio.Queue(self.max_queue))
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(user_id)
+                subscribers.discard(entry)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'NOTIFICATION_PUBSUB_BACKEND', 'social.pubsub.LocalBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish(user_id, message):
+    try:
+        get_broker().publish(user_id, message)
+    except Exception as e:
+        # push is best effort; clients fall back to polling
+        logger.error(f"Failed to publish to user {user_id}: {e}")
@@ -46,14 +46,14 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = [
             'id', 'sender_username', 'recipient_username', 'notification_type',
-            'post', 'message', 'is_read', 'created_at'
+            'post', 'message', 'is_read', 'created_at', 'actor_count', 'actor_ids'
         ]
 
 
 class AdminUserSerializer(serializers.ModelSerializer):
-    posts_count = serializers.SerializerMethodField()
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
+    posts_count = serializers.IntegerField(source='profile.posts_count', read_only=True)
+    followers_count = serializers.IntegerField(source='profile.followers_count', read_only=True)
+    following_count = serializers.IntegerField(source='profile.following_count', read_only=True)
     
     class Meta:
         model = User
@@ -63,15 +63,6 @@ class AdminUserSerializer(serializers.ModelSerializer):
             'posts_count', 'followers_count', 'following_count'
         ]
     
-    def get_posts_count(self, obj):
-        return Post.objects.filter(author=obj, is_active=True).count()
-    
-    def get_followers_count(self, obj):
-        return obj.followers_set.count()
-    
-    def get_following_count(self, obj):
-        return obj.following_set.count()
-    
 
 
 class AdminPostSerializer(serializers.ModelSerializer):
@@ -1,44 +1,130 @@
 from django.dispatch import receiver
-from .models import Follow, Like, Comment, Notification
-from supabase import create_client
-import os
-from django.db.models.signals import post_save, post_delete
+from .models import Follow, Like, Comment
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.db import transaction
+from posts.models import Post
+from posts import counters, images
+from accounts import counters as profile_counters
+from . import feed_cache, follow_cache, notifications, timeline
 
 @receiver(post_save, sender=Follow)
 def create_follow_notification(sender, instance, created, **kwargs):
     if created:
-        Notification.objects.create(
-            recipient=instance.following,
-            sender=instance.follower,
-            notification_type='follow',
-            message=f"{instance.follower.username} started following you"
-        )
+        notifications.enqueue('follow', instance.follower_id, recipient_id=instance.following_id)
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        profile_counters.adjust(instance.follower_id, 'following_count', 1)
+        profile_counters.adjust(instance.following_id, 'followers_count', 1)
+        transaction.on_commit(lambda: timeline.workers.submit(timeline.sync_author_mode, instance.following_id))
+
+
+@receiver(post_delete, sender=Follow)
+def count_unfollow(sender, instance, **kwargs):
+    profile_counters.adjust(instance.follower_id, 'following_count', -1)
+    profile_counters.adjust(instance.following_id, 'followers_count', -1)
+    transaction.on_commit(lambda: timeline.workers.submit(timeline.sync_author_mode, instance.following_id))
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_active(sender, instance, **kwargs):
+    # posts_count only tracks active posts, so note the stored flag before
+    # an update to tell whether it changed. Post.from_db records it when the
+    # post is loaded; only a post built by hand or loaded without the field
+    # needs a query.
+    if instance.pk and not instance._state.adding and not hasattr(instance, '_loaded_is_active'):
+        instance._loaded_is_active = Post.objects.filter(pk=instance.pk) \
+            .values_list('is_active', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    if created:
+        was_active = False
+    else:
+        was_active = getattr(instance, '_loaded_is_active', instance.is_active)
+    if instance.is_active != was_active:
+        profile_counters.adjust(instance.author_id, 'posts_count', 1 if instance.is_active else -1)
+    instance._loaded_is_active = instance.is_active
+
+
+@receiver(post_delete, sender=Post)
+def count_post_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        profile_counters.adjust(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_cache(sender, instance, **kwargs):
+    follow_cache.invalidate(instance.follower_id)
+    # and again once committed, in case a reader re-cached the old set meanwhile
+    transaction.on_commit(lambda: follow_cache.invalidate(instance.follower_id))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline_on_follow(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: timeline.workers.submit(
+            timeline.backfill_follow, instance.follower_id, instance.following_id
+        ))
+
+
+@receiver(post_delete, sender=Follow)
+def drop_timeline_on_unfollow(sender, instance, **kwargs):
+    timeline.drop_follow(instance.follower_id, instance.following_id)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        # fan_out_post drops the followers' cached feeds once it is done
+        transaction.on_commit(lambda: timeline.workers.submit(timeline.fan_out_post, instance))
+
+
+# Registered after the timeline handlers, so their on_commit work runs first
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_feed_on_follow(sender, instance, **kwargs):
+    transaction.on_commit(lambda: feed_cache.invalidate_viewers([instance.follower_id]))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_feed_on_post(sender, instance, created=False, **kwargs):
+    # new posts are handled by fan_out_post once their timeline rows exist
+    if created:
+        return
+    transaction.on_commit(lambda: feed_cache.bump_author(instance.author_id))
+
+
+@receiver(images.image_ready)
+def invalidate_feed_on_image(sender, author_id, **kwargs):
+    feed_cache.bump_author(author_id)
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def forget_feed_likes(sender, instance, **kwargs):
+    feed_cache.forget_likes(instance.user_id)
+    transaction.on_commit(lambda: feed_cache.forget_likes(instance.user_id))
+
 
 @receiver(post_save, sender=Like)
 def create_like_notification(sender, instance, created, **kwargs):
     if created:
-        # Update post like count
-        post = instance.post
-        post.like_count = post.likes.count()
-        post.save()
+        counters.increment(instance.post_id, 'like_count')
         
-        # Create notification (don't notify yourself)
-        if instance.user != instance.post.author:
-            Notification.objects.create(
-                recipient=instance.post.author,
-                sender=instance.user,
-                notification_type='like',
-                post=instance.post,
-                message=f"{instance.user.username} liked your post"
-            )
+        # Written in the background; self-likes are dropped there
+        notifications.enqueue('like', instance.user_id, post_id=instance.post_id)
 
 
 @receiver(post_delete, sender=Like)
 def update_like_count_on_delete(sender, instance, **kwargs):
-    # Update post like count when like is deleted
-    post = instance.post
-    post.like_count = post.likes.count()
-    post.save()
+    counters.decrement(instance.post_id, 'like_count')
 
 
 
@@ -48,46 +134,14 @@ def update_like_count_on_delete(sender, instance, **kwargs):
 @receiver(post_save, sender=Comment)
 def create_comment_notification(sender, instance, created, **kwargs):
     if created:
-        # Update post comment count
-        post = instance.post
-        post.comment_count = post.comments.filter(is_active=True).count()
-        post.save()
+        if instance.is_active:
+            counters.increment(instance.post_id, 'comment_count')
         
-        # Create notification (don't notify yourself)
-        if instance.author != instance.post.author:
-            Notification.objects.create(
-                recipient=instance.post.author,
-                sender=instance.author,
-                notification_type='comment',
-                post=instance.post,
-                message=f"{instance.author.username} commented on your post"
-            )
+        # Written in the background; self-comments are dropped there
+        notifications.enqueue('comment', instance.author_id, post_id=instance.post_id)
 
 
 @receiver(post_delete, sender=Comment)
 def update_comment_count_on_delete(sender, instance, **kwargs):
-    # Update post comment count when comment is deleted
-    post = instance.post
-    post.comment_count = post.comments.filter(is_active=True).count()
-    post.save()
-
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-
-
-
-def send_to_supabase(notification):
-    supabase.table("notifications").insert({
-        "recipient_id": notification.recipient.id,
-        "sender_id": notification.sender.id,
-        "notification_type": notification.notification_type,
-        "post_id": notification.post.id if notification.post else None,
-        "message": notification.message,
-        "is_read": notification.is_read,
-        "created_at": notification.created_at.isoformat()
-    }).execute()
-
-
-
+    if instance.is_active:
+        counters.decrement(instance.post_id, 'comment_count')
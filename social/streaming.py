@@ -0,0 +1,160 @@
+# social/streaming.py
+"""
+Server-Sent Events stream of a user's notifications.
+
+GET /api/notifications/stream/ with an Authorization: Bearer header, or
+with ?ticket=<ticket> for clients such as EventSource that cannot set
+headers, keeps the connection open and pushes:
+
+    event: unread_count   data: {"unread_count": 3}        (on connect)
+    event: notification   data: {...serialized notification...}
+    event: unread_count   data: {"delta": 1} / {"unread_count": 0}
+
+A ticket comes from POST /api/notifications/stream-ticket/. It is signed,
+names only the user, expires after NOTIFICATION_STREAM_TICKET_TTL seconds
+and is accepted once, in any process (used nonces are recorded in the
+RedeemedStreamTicket table), so the access token itself never appears in a
+URL or access log. Either way the user goes through the same checks as any API
+request (CachedJWTAuthentication): deactivated users and tokens from before
+a password change are refused.
+
+Served straight from core/asgi.py so a connection does not hold a Django
+request thread.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from datetime import timedelta
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from accounts.authentication import CachedJWTAuthentication, user_states
+
+from . import notifications
+from .models import RedeemedStreamTicket
+from .pubsub import get_broker
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATHS = ('/api/notifications/stream/', '/api/social/notifications/stream/')
+
+
+TICKET_SALT = 'social.streaming.ticket'
+
+
+def ticket_ttl():
+    return getattr(settings, 'NOTIFICATION_STREAM_TICKET_TTL', 30)
+
+
+def issue_ticket(user_id):
+    return signing.dumps({'user_id': user_id, 'nonce': uuid.uuid4().hex}, salt=TICKET_SALT, compress=True)
+
+
+def redeem_ticket(ticket):
+    """User ID of a valid, unused ticket, or None. A ticket works once."""
+    try:
+        claims = signing.loads(ticket, salt=TICKET_SALT, max_age=ticket_ttl())
+    except signing.BadSignature:
+        return None
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            RedeemedStreamTicket.objects.create(
+                nonce=claims['nonce'], expires_at=now + timedelta(seconds=ticket_ttl())
+            )
+    except IntegrityError:
+        return None
+    # past max_age the signature check refuses the ticket by itself
+    RedeemedStreamTicket.objects.filter(expires_at__lt=now).delete()
+    state = user_states.get(claims['user_id'])
+    if state is None or not state.row['is_active']:
+        return None
+    return claims['user_id']
+
+
+def _header_token(scope):
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            return value
+    return None
+
+
+def authenticate_sync(scope):
+    """User ID from the Authorization header or a ?ticket=, or None."""
+    header = _header_token(scope)
+    if header:
+        auth = CachedJWTAuthentication()
+        raw = auth.get_raw_token(header)
+        if raw is None:
+            return None
+        try:
+            return auth.get_user(auth.get_validated_token(raw)).pk
+        except (InvalidToken, AuthenticationFailed):
+            return None
+    query = parse_qs(scope.get('query_string', b'').decode())
+    ticket = query.get('ticket', [None])[0]
+    return redeem_ticket(ticket) if ticket else None
+
+
+authenticate = sync_to_async(authenticate_sync)
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def notification_stream(scope, receive, send):
+    user_id = await authenticate(scope)
+    if user_id is None:
+        await send({'type': 'http.response.start', 'status': 401,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': b'{"detail": "Authentication required"}'})
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+
+    async with get_broker().subscribe(user_id) as queue:
+        count = await sync_to_async(notifications.unread_count)(user_id)
+        await send({'type': 'http.response.body', 'body': format_event('unread_count', {'unread_count': count}),
+                    'more_body': True})
+
+        disconnect = asyncio.ensure_future(receive())
+        try:
+            while True:
+                message = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({message, disconnect}, timeout=heartbeat,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnect in done:
+                    if disconnect.result()['type'] == 'http.disconnect':
+                        message.cancel()
+                        break
+                    disconnect = asyncio.ensure_future(receive())
+                if message in done:
+                    event, data = message.result()
+                    body = format_event(event, data)
+                elif not done:
+                    message.cancel()
+                    body = b': ping\n\n'
+                else:
+                    message.cancel()
+                    continue
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            disconnect.cancel()
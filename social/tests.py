@@ -1,3 +1,483 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.workers import OUTBOX_PARKED
+from posts.models import Post
+from accounts.authentication import user_states
+from accounts.serializers import get_tokens_for_user
+
+from . import outbox, streaming, timeline, views
+from .models import Follow, Like, Notification, NotificationOutbox, TimelineEntry
+from .notifications import NotificationEvent, NotificationQueue, write_notifications
+
+User = get_user_model()
+
+
+class FakeSupabase(BaseHTTPRequestHandler):
+    """Records PostgREST inserts; answers with the class-level status."""
+    status = 201
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        FakeSupabase.requests.append((dict(self.headers), json.loads(body)))
+        self.send_response(self.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class NotificationOutboxTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = HTTPServer(('127.0.0.1', 0), FakeSupabase)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}/rest/v1/notifications'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        FakeSupabase.status = 201
+        FakeSupabase.requests = []
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+        self.post = Post.objects.create(author=self.bob, content='hello')
+        self.settings_override = override_settings(
+            NOTIFICATION_MIRROR_ENABLED=True,
+            NOTIFICATION_MIRROR_URL=self.url,
+            NOTIFICATION_MIRROR_KEY='test-key',
+            NOTIFICATION_OUTBOX_INTERVAL=0,
+            NOTIFICATION_COALESCE_WINDOW=0,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def queue(self, n):
+        users = [User.objects.create_user(f'fan{i}', f'fan{i}@example.com', 'pw') for i in range(n)]
+        write_notifications([NotificationEvent('like', u.id, post_id=self.post.id) for u in users])
+
+    def test_batches_are_shipped_and_removed(self):
+        self.queue(3)
+        self.assertEqual(NotificationOutbox.objects.count(), 3)
+
+        self.assertEqual(outbox.drain(batch_size=2), 3)
+
+        self.assertEqual(len(FakeSupabase.requests), 2)
+        headers, rows = FakeSupabase.requests[0]
+        self.assertEqual(headers['apikey'], 'test-key')
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['recipient_id'], self.bob.id)
+        self.assertEqual(rows[0]['notification_type'], 'like')
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_failed_batch_backs_off(self):
+        FakeSupabase.status = 503
+        self.queue(2)
+
+        with self.assertLogs('social.outbox', 'WARNING'):
+            self.assertEqual(outbox.drain(), 0)
+
+        row = NotificationOutbox.objects.first()
+        self.assertEqual(row.attempts, 1)
+        self.assertIn('503', row.last_error)
+        # not due again until the backoff expires
+        FakeSupabase.status = 201
+        self.assertEqual(outbox.drain(), 0)
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+
+    def test_exhausted_rows_are_parked(self):
+        FakeSupabase.status = 503
+        self.queue(1)
+
+        with override_settings(NOTIFICATION_OUTBOX_MAX_ATTEMPTS=1), self.assertLogs(level='WARNING'):
+            self.assertEqual(outbox.drain(), 0)
+
+        self.assertEqual(NotificationOutbox.objects.get().status, OUTBOX_PARKED)
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.drain(), 0)
+        self.assertEqual(len(FakeSupabase.requests), 1)
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOW=3600)
+    def test_coalesced_update_replaces_pending_row(self):
+        self.queue(1)
+        fan = User.objects.create_user('late', 'late@example.com', 'pw')
+        write_notifications([NotificationEvent('like', fan.id, post_id=self.post.id)])
+
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertEqual(outbox.drain(), 1)
+        headers, rows = FakeSupabase.requests[0]
+        self.assertIn('resolution=merge-duplicates', headers['Prefer'])
+        self.assertEqual(rows[0]['id'], Notification.objects.get().id)
+        self.assertEqual(rows[0]['actor_count'], 2)
+
+    def test_nothing_recorded_without_mirror(self):
+        with override_settings(NOTIFICATION_MIRROR_URL=None, SUPABASE_URL=None):
+            self.queue(1)
+        with override_settings(NOTIFICATION_MIRROR_ENABLED=False):
+            write_notifications([NotificationEvent('like', self.alice.id, post_id=self.post.id)])
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+
+@override_settings(
+    TIMELINE_WORKERS=0, TIMELINE_FANOUT_LIMIT=2, TIMELINE_FANOUT_RESUME_LIMIT=1, NOTIFICATION_FLUSH_INTERVAL=0,
+)
+class TimelineModeTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.readers = [
+            User.objects.create_user(f'reader{i}', f'reader{i}@example.com', 'pw') for i in range(3)
+        ]
+
+    def follow(self, reader):
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=reader, following=self.author)
+
+    def test_author_switches_to_pull_and_back_with_backfill(self):
+        for reader in self.readers:
+            self.follow(reader)
+        self.assertTrue(timeline.is_pull_author(self.author.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.author, content='while pulled')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        # pulled at read time meanwhile
+        self.assertIn(post, list(timeline.HomeTimeline(self.readers[0])[:10]))
+
+        # one unfollow stays above the resume limit
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.filter(follower=self.readers[2]).delete()
+        self.assertTrue(timeline.is_pull_author(self.author.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.filter(follower=self.readers[1]).delete()
+        self.assertFalse(timeline.is_pull_author(self.author.id))
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(post=post).values_list('owner_id', flat=True)),
+            [self.readers[0].id],
+        )
+
+    def test_late_timeline_writes_after_unfollow_are_not_read(self):
+        reader = self.readers[0]
+        post = Post.objects.create(author=self.author, content='before')
+        self.follow(reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.filter(follower=reader).delete()
+
+        # a backfill queued before the unfollow runs after it
+        self.assertEqual(timeline.backfill_follow(reader.id, self.author.id), 0)
+        self.assertFalse(TimelineEntry.objects.filter(owner=reader).exists())
+        # as does a fan-out that read the follower list before it
+        TimelineEntry.objects.create(owner=reader, post=post, author=self.author, created_at=post.created_at)
+        self.assertEqual(list(timeline.HomeTimeline(reader)[:10]), [])
+
+
+@override_settings(NOTIFICATION_FLUSH_INTERVAL=0)
+class ToggleViewTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+        self.post = Post.objects.create(author=self.bob, content='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_like_twice(self):
+        url = f'/api/social/posts/{self.post.id}/like/'
+        self.assertEqual(self.client.post(url).status_code, 200)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['detail'], 'Already liked')
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+
+    def test_like_missing_post(self):
+        self.assertEqual(self.client.post('/api/social/posts/999999/like/').status_code, 404)
+        self.assertFalse(Like.objects.exists())
+
+    def test_unlike(self):
+        Like.objects.create(user=self.alice, post=self.post)
+        url = f'/api/social/posts/{self.post.id}/unlike/'
+        self.assertEqual(self.client.delete(url).status_code, 200)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+
+    def test_follow_twice_and_missing_user(self):
+        url = f'/api/social/users/{self.bob.id}/follow/'
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.post('/api/social/users/999999/follow/').status_code, 404)
+        self.bob.profile.refresh_from_db()
+        self.assertEqual(self.bob.profile.followers_count, 1)
+
+    def test_unfollow(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        url = f'/api/social/users/{self.bob.id}/unfollow/'
+        self.assertEqual(self.client.delete(url).status_code, 200)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['detail'], 'You are not following this user')
+        self.bob.profile.refresh_from_db()
+        self.assertEqual(self.bob.profile.followers_count, 0)
+
+    def test_each_toggle_is_one_statement(self):
+        for method, url, table in [
+            ('post', f'/api/social/posts/{self.post.id}/like/', 'social_like'),
+            ('delete', f'/api/social/posts/{self.post.id}/unlike/', 'social_like'),
+            ('post', f'/api/social/users/{self.bob.id}/follow/', 'social_follow'),
+            ('delete', f'/api/social/users/{self.bob.id}/unfollow/', 'social_follow'),
+        ]:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(getattr(self.client, method)(url).status_code, 200)
+            self.assertEqual(len([q for q in queries if f'"{table}"' in q['sql']]), 1, url)
+
+
+class BatchStatusTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+        self.carol = User.objects.create_user('carol', 'carol@example.com', 'pw')
+        self.posts = [Post.objects.create(author=self.bob, content=f'post {i}') for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.addCleanup(cache.clear)
+
+    def test_like_status_in_one_query(self):
+        Like.objects.create(user=self.alice, post=self.posts[1])
+        ids = f'{self.posts[0].id},{self.posts[1].id},999999'
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/social/posts/like-status/', {'ids': ids})
+        self.assertEqual(response.data, {str(self.posts[0].id): False, str(self.posts[1].id): True, '999999': False})
+        # answered from the per-viewer cache until a like changes it
+        with self.assertNumQueries(0):
+            self.client.get('/api/social/posts/like-status/', {'ids': ids})
+        Like.objects.create(user=self.alice, post=self.posts[0])
+        response = self.client.get('/api/social/posts/like-status/', {'ids': ids})
+        self.assertTrue(response.data[str(self.posts[0].id)])
+
+    def test_relationship_status(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        Follow.objects.create(follower=self.carol, following=self.alice)
+
+        # repeated ?ids= and duplicates are accepted
+        response = self.client.get(
+            f'/api/social/users/relationship-status/?ids={self.bob.id},{self.carol.id}&ids={self.bob.id}'
+        )
+        self.assertEqual(response.data, {
+            str(self.bob.id): {'following': True, 'followed_by': False},
+            str(self.carol.id): {'following': False, 'followed_by': True},
+        })
+
+    def test_bad_and_over_limit_ids(self):
+        for url in ['/api/social/posts/like-status/', '/api/social/users/relationship-status/']:
+            too_many = ','.join(str(i) for i in range(1, views.MAX_STATUS_IDS + 2))
+            self.assertEqual(self.client.get(url, {'ids': too_many}).status_code, 400)
+            self.assertEqual(self.client.get(url, {'ids': '1,two'}).status_code, 400)
+            self.assertEqual(self.client.get(url).data, {})
+        at_limit = ','.join(str(i) for i in range(1, views.MAX_STATUS_IDS + 1))
+        self.assertEqual(self.client.get('/api/social/posts/like-status/', {'ids': at_limit}).status_code, 200)
+
+    def test_requires_authentication(self):
+        response = APIClient().get('/api/social/posts/like-status/', {'ids': '1'})
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(NOTIFICATION_COALESCE_WINDOW=0, NOTIFICATION_MAX_ATTEMPTS=2, NOTIFICATION_MIRROR_URL=None)
+class NotificationQueueTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+        self.post = Post.objects.create(author=self.bob, content='hello')
+        self.queue = NotificationQueue()
+
+    def test_bad_event_is_retried_alone_then_dropped(self):
+        # an unknown type cannot be rendered, so its writes always fail
+        self.queue._pending = [
+            NotificationEvent('like', self.alice.id, post_id=self.post.id),
+            NotificationEvent('unknown', self.alice.id, recipient_id=self.bob.id),
+        ]
+
+        with self.assertLogs('social.notifications', 'WARNING'):
+            self.assertEqual(self.queue.flush(), 1)
+            self.assertEqual(len(self.queue._pending), 1)
+            self.assertEqual(self.queue.flush(), 0)
+        self.assertEqual(self.queue._pending, [])
+        self.assertEqual(Notification.objects.filter(recipient=self.bob).count(), 1)
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOW=3600, NOTIFICATION_ACTOR_SAMPLE=2)
+    def test_coalesced_count_is_distinct_actors(self):
+        fans = [User.objects.create_user(f'fan{i}', f'fan{i}@example.com', 'pw') for i in range(3)]
+        like = lambda user: NotificationEvent('like', user.id, post_id=self.post.id)
+        write_notifications([like(fans[0]), like(fans[1]), like(fans[0])])
+        write_notifications([like(fans[2])])
+        # fans[0] has dropped out of the two-ID sample by now
+        write_notifications([like(fans[0])])
+
+        notification = Notification.objects.get(recipient=self.bob)
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.actor_ids, [fans[0].id, fans[2].id])
+        self.assertEqual(notification.message, 'fan0 and 2 others liked your post')
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOW=3600)
+    def test_coalesce_window_boundary(self):
+        fans = [User.objects.create_user(f'fan{i}', f'fan{i}@example.com', 'pw') for i in range(3)]
+        like = lambda user: NotificationEvent('like', user.id, post_id=self.post.id)
+        write_notifications([like(fans[0])])
+        first = Notification.objects.get()
+
+        # just inside the window: merged into the row and moved to the top
+        Notification.objects.update(created_at=timezone.now() - timedelta(seconds=3590))
+        write_notifications([like(fans[1])])
+        first.refresh_from_db()
+        self.assertEqual((Notification.objects.count(), first.actor_count), (1, 2))
+        self.assertGreater(first.created_at, timezone.now() - timedelta(seconds=60))
+
+        # just past it: a row of its own
+        Notification.objects.update(created_at=timezone.now() - timedelta(seconds=3610))
+        write_notifications([like(fans[2])])
+        self.assertEqual(
+            list(Notification.objects.order_by('id').values_list('actor_count', flat=True)), [2, 1]
+        )
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOW=3600)
+    def test_read_rows_and_follows_are_not_coalesced(self):
+        carol = User.objects.create_user('carol', 'carol@example.com', 'pw')
+        write_notifications([NotificationEvent('like', self.alice.id, post_id=self.post.id)])
+        Notification.objects.update(is_read=True)
+        write_notifications([
+            NotificationEvent('like', carol.id, post_id=self.post.id),
+            NotificationEvent('follow', self.alice.id, recipient_id=self.bob.id),
+            NotificationEvent('follow', carol.id, recipient_id=self.bob.id),
+            # self-likes never notify
+            NotificationEvent('like', self.bob.id, post_id=self.post.id),
+        ])
+
+        self.assertEqual(Notification.objects.filter(notification_type='like').count(), 2)
+        self.assertEqual(Notification.objects.filter(notification_type='follow').count(), 2)
+        self.assertEqual(set(Notification.objects.values_list('actor_count', flat=True)), {1})
+
+    def test_events_for_missing_rows_are_skipped(self):
+        written = write_notifications([
+            NotificationEvent('follow', self.alice.id, recipient_id=999999),
+            NotificationEvent('like', self.alice.id, post_id=999999),
+            NotificationEvent('follow', self.alice.id, recipient_id=self.bob.id),
+        ])
+
+        self.assertEqual([n.recipient_id for n in written], [self.bob.id])
+
+
+class StreamAuthenticationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        # IDs repeat between tests, so don't trust rows cached by earlier ones
+        user_states.clear()
+        self.addCleanup(user_states.clear)
+
+    def scope(self, header=None, query=''):
+        headers = [(b'authorization', header.encode())] if header else []
+        return {'headers': headers, 'query_string': query.encode()}
+
+    def test_header_token_goes_through_account_checks(self):
+        access = get_tokens_for_user(self.alice)['access']
+        self.assertEqual(streaming.authenticate_sync(self.scope(f'Bearer {access}')), self.alice.id)
+
+        self.alice.set_password('changed')
+        self.alice.save()
+        self.assertIsNone(streaming.authenticate_sync(self.scope(f'Bearer {access}')))
+
+    def test_ticket_works_once(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        ticket = client.post('/api/notifications/stream-ticket/').data['ticket']
+
+        self.assertEqual(streaming.authenticate_sync(self.scope(query=f'ticket={ticket}')), self.alice.id)
+        self.assertIsNone(streaming.authenticate_sync(self.scope(query=f'ticket={ticket}')))
+        # replayed against another process, which shares nothing but the database
+        cache.clear()
+        user_states.clear()
+        self.assertIsNone(streaming.authenticate_sync(self.scope(query=f'ticket={ticket}')))
+
+    def test_expired_ticket_is_refused(self):
+        ticket = streaming.issue_ticket(self.alice.id)
+        with override_settings(NOTIFICATION_STREAM_TICKET_TTL=-1):
+            self.assertIsNone(streaming.authenticate_sync(self.scope(query=f'ticket={ticket}')))
+        self.assertEqual(streaming.authenticate_sync(self.scope(query=f'ticket={ticket}')), self.alice.id)
+
+    def test_access_token_in_query_is_refused(self):
+        access = get_tokens_for_user(self.alice)['access']
+        self.assertIsNone(streaming.authenticate_sync(self.scope(query=f'token={access}')))
+        self.assertIsNone(streaming.authenticate_sync(self.scope(query=f'ticket={access}')))
+
+
+@override_settings(
+    TIMELINE_WORKERS=0, TIMELINE_FANOUT_LIMIT=1, TIMELINE_FANOUT_RESUME_LIMIT=0, NOTIFICATION_FLUSH_INTERVAL=0,
+)
+class FeedCacheTests(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user('reader', 'reader@example.com', 'pw')
+        self.pushed = User.objects.create_user('pushed', 'pushed@example.com', 'pw')
+        self.pulled = User.objects.create_user('pulled', 'pulled@example.com', 'pw')
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.reader, following=self.pushed)
+            Follow.objects.create(follower=self.reader, following=self.pulled)
+            Follow.objects.create(follower=other, following=self.pulled)
+        self.assertTrue(timeline.is_pull_author(self.pulled.id))
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.addCleanup(cache.clear)
+
+    def contents(self):
+        return [item['content'] for item in self.client.get('/api/feed/?cursor=').data['results']]
+
+    def post(self, author, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(author=author, content=content)
+
+    def test_new_posts_and_edits_reach_cached_pages(self):
+        first = self.post(self.pushed, 'first')
+        self.assertEqual(self.contents(), ['first'])
+        # served from the cache: a write that bypasses the signals is not seen
+        Post.objects.filter(pk=first.pk).update(content='unseen')
+        self.assertEqual(self.contents(), ['first'])
+
+        # no timeline rows are written for a pull author's post
+        self.post(self.pulled, 'pulled')
+        self.assertEqual(self.contents(), ['pulled', 'unseen'])
+        self.post(self.pushed, 'pushed')
+        self.assertEqual(self.contents(), ['pushed', 'pulled', 'unseen'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.content = 'edited'
+            first.save()
+        self.assertEqual(self.contents(), ['pushed', 'pulled', 'edited'])
+
+    def test_edit_during_build_is_not_cached_as_current(self):
+        first = self.post(self.pushed, 'first')
+        build = views.build_feed_page
+
+        def build_then_edit(*args, **kwargs):
+            payload = build(*args, **kwargs)
+            with self.captureOnCommitCallbacks(execute=True):
+                first.content = 'edited'
+                first.save()
+            return payload
+
+        with mock.patch.object(views, 'build_feed_page', build_then_edit):
+            self.assertEqual(self.contents(), ['first'])
+        self.assertEqual(self.contents(), ['edited'])
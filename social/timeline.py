@@ -0,0 +1,269 @@
+# social/timeline.py
+"""
+Fan-out-on-write home timelines.
+
+New posts are pushed into a TimelineEntry row for every follower of the
+author, so a feed page is a single range read on (owner, created_at).
+Authors with more than TIMELINE_FANOUT_LIMIT followers are not fanned out;
+their posts are pulled at read time and merged into the page instead.
+
+The PullAuthor table is the one record of which authors are pulled: both
+fan-out and feed reads consult it. sync_author_mode() moves an author
+between the two modes after their follower count changes, switching back
+to push only at TIMELINE_FANOUT_RESUME_LIMIT so an author hovering at the
+limit does not flap, and fanning out the posts made while they were pulled.
+Fan-out and backfills run on the `workers` pool, off the request path, so
+they can land after an unfollow has dropped the entries: reads only take
+entries from authors the owner still follows.
+"""
+import heapq
+import logging
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Count, Exists, F, OuterRef
+from django.utils import timezone
+
+from accounts.models import Profile
+from core.workers import WorkerPool
+from posts.counters import sample_drift
+from posts.models import Post
+from posts.pagination import keyset_filter
+from . import feed_cache
+from .models import Follow, PullAuthor, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+workers = WorkerPool('timeline-fanout', 'TIMELINE_WORKERS', 2)
+
+
+def fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 5000)
+
+
+def resume_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_RESUME_LIMIT', int(fanout_limit() * 0.9))
+
+
+def _bulk_insert(entries, batch_size=1000):
+    entries = iter(entries)
+    total = 0
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return total
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+
+
+def is_pull_author(author_id):
+    return PullAuthor.objects.filter(author_id=author_id).exists()
+
+
+def _fan_out(author_id, posts, batch_size=1000):
+    """
+    Push (post_id, created_at) pairs into every follower's timeline and drop
+    the cached feed pages of each follower written to.
+    """
+    follower_ids = (
+        Follow.objects.filter(following_id=author_id)
+        .values_list('follower_id', flat=True)
+        .iterator(chunk_size=batch_size)
+    )
+    total = 0
+    while True:
+        batch = list(islice(follower_ids, batch_size))
+        if not batch:
+            return total
+        total += _bulk_insert(
+            TimelineEntry(owner_id=follower_id, post_id=post_id, author_id=author_id, created_at=created_at)
+            for follower_id in batch
+            for post_id, created_at in posts
+        )
+        feed_cache.invalidate_viewers(batch)
+
+
+def fan_out_post(post):
+    """
+    Push a new post into the timeline of each of its author's followers.
+    For a pull author, only the cached pages that pull them are dropped.
+    """
+    if not post.is_active:
+        return 0
+    if is_pull_author(post.author_id):
+        feed_cache.bump_author(post.author_id)
+        return 0
+    count = _fan_out(post.author_id, [(post.id, post.created_at)])
+    logger.debug(f"Fanned out post {post.id} to {count} timelines")
+    return count
+
+
+def sync_author_mode(author_id):
+    """
+    Switch an author to pull once they pass the fan-out limit, or back to
+    push once they drop to the resume limit. Returns the new mode.
+    """
+    followers = Profile.objects.filter(user_id=author_id) \
+        .values_list('followers_count', flat=True).first() or 0
+    pulled = PullAuthor.objects.filter(author_id=author_id).first()
+    if pulled is None:
+        if followers > fanout_limit():
+            PullAuthor.objects.bulk_create(
+                [PullAuthor(author_id=author_id, since=timezone.now())], ignore_conflicts=True
+            )
+            # cached pages from before the switch do not watch this author yet
+            feed_cache.invalidate_author(author_id)
+            logger.info(f"Author {author_id} switched to pull ({followers} followers)")
+            return 'pull'
+        return 'push'
+
+    if followers > resume_limit():
+        return 'pull'
+    # conditional, so only one caller performs the switch and its backfill
+    deleted, _ = PullAuthor.objects.filter(author_id=author_id, since=pulled.since).delete()
+    if deleted:
+        size = getattr(settings, 'TIMELINE_BACKFILL_SIZE', 200)
+        missed = list(
+            Post.objects.filter(author_id=author_id, is_active=True, created_at__gte=pulled.since)
+            .order_by('-created_at')
+            .values_list('id', 'created_at')[:size]
+        )
+        count = _fan_out(author_id, missed)
+        logger.info(f"Author {author_id} switched to push; backfilled {count} timeline entries")
+    return 'push'
+
+
+def backfill_follow(follower_id, author_id):
+    """Copy an author's recent posts into a new follower's timeline."""
+    follow = Follow.objects.filter(follower_id=follower_id, following_id=author_id)
+    if is_pull_author(author_id) or not follow.exists():
+        return 0
+    size = getattr(settings, 'TIMELINE_BACKFILL_SIZE', 200)
+    recent = (
+        Post.objects.filter(author_id=author_id, is_active=True)
+        .order_by('-created_at')
+        .values_list('id', 'created_at')[:size]
+    )
+    count = _bulk_insert(
+        TimelineEntry(owner_id=follower_id, post_id=post_id, author_id=author_id, created_at=created_at)
+        for post_id, created_at in recent
+    )
+    if not follow.exists():
+        # unfollowed while copying; drop_follow may have run before the insert
+        drop_follow(follower_id, author_id)
+        return 0
+    # the follow already dropped the cached feed, but it may have been
+    # rebuilt before this ran
+    feed_cache.invalidate_viewers([follower_id])
+    return count
+
+
+def drop_follow(follower_id, author_id):
+    TimelineEntry.objects.filter(owner_id=follower_id, author_id=author_id).delete()
+
+
+def rebuild_timeline(user_id):
+    """Rebuild one user's timeline from scratch."""
+    TimelineEntry.objects.filter(owner_id=user_id).delete()
+    total = 0
+    author_ids = Follow.objects.filter(follower_id=user_id).values_list('following_id', flat=True)
+    for author_id in author_ids:
+        total += backfill_follow(user_id, author_id)
+    return total
+
+
+class HomeTimeline:
+    """
+    A user's home feed: their materialized timeline merged with posts from
+    followed pull authors, newest first.
+
+    Supports count() and slicing so it can be handed straight to
+    django.core.paginator.Paginator.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.pull_ids = list(
+            PullAuthor.objects.filter(
+                author_id__in=Follow.objects.filter(follower=user).values('following_id')
+            ).values_list('author_id', flat=True)
+        )
+
+    def entries(self):
+        return TimelineEntry.objects.filter(
+            owner=self.user,
+            author_id__in=Follow.objects.filter(follower=self.user).values('following_id'),
+            post__is_active=True,
+        )
+
+    def pulled(self):
+        # Skip posts that already made it into the timeline before the
+        # author crossed the fan-out limit.
+        return Post.objects.filter(author_id__in=self.pull_ids, is_active=True).exclude(
+            Exists(TimelineEntry.objects.filter(owner=self.user, post=OuterRef('pk')))
+        )
+
+    def count(self):
+        total = self.entries().count()
+        if self.pull_ids:
+            total += self.pulled().count()
+        return total
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        return self.load(self.keys(stop)[start:stop])
+
+    def keys(self, limit, after=None):
+        """
+        Newest (created_at, post_id) pairs across both sources, optionally
+        strictly older than the `after` position (keyset pagination).
+        """
+        entries = self.entries()
+        pulled = self.pulled() if self.pull_ids else None
+        if after:
+            entries = entries.filter(keyset_filter(after, pk_field='post_id'))
+            if pulled is not None:
+                pulled = pulled.filter(keyset_filter(after))
+        sources = [
+            entries.order_by('-created_at', '-post_id')
+            .values_list('created_at', 'post_id')[:limit]
+        ]
+        if pulled is not None:
+            sources.append(
+                pulled.order_by('-created_at', '-id')
+                .values_list('created_at', 'id')[:limit]
+            )
+        return list(islice(heapq.merge(*sources, reverse=True), limit))
+
+    def load(self, keys):
+        """
+        Fetch the posts for a page of keys, preserving their order.
+
+        FEED_COUNT_SOURCE picks where like_count_actual/comment_count_actual
+        come from: 'columns' serves the denormalized Post counters (with a
+        sampled drift check), 'aggregate' recounts likes and comments.
+        """
+        ids = [post_id for _, post_id in keys]
+        # is_liked is overlaid by the view (see social/feed_cache.py)
+        posts = Post.objects.filter(id__in=ids).select_related('author__profile')
+        use_columns = getattr(settings, 'FEED_COUNT_SOURCE', 'columns') == 'columns'
+        if use_columns:
+            posts = posts.annotate(
+                like_count_actual=F('like_count'),
+                comment_count_actual=F('comment_count'),
+            )
+        else:
+            posts = posts.annotate(
+                like_count_actual=Count('likes', distinct=True),
+                comment_count_actual=Count('comments', distinct=True),
+            )
+        by_id = {post.id: post for post in posts}
+        page = [by_id[post_id] for post_id in ids if post_id in by_id]
+        if use_columns:
+            sample_drift(page)
+        return page
@@ -0,0 +1,73 @@
+# social/toggles.py
+"""
+Single-statement writes for follow/like toggles.
+
+add() is one INSERT ... SELECT ... ON CONFLICT DO NOTHING that only inserts
+while the target row (the post, the followed user) exists, and remove() is
+one DELETE ... RETURNING; each reports whether a row changed, so views need
+no lookups or exists() checks first. Neither goes through Model.save() or
+the deletion collector, so they send post_save/post_delete themselves and
+the receivers in social/signals.py (counters, notifications, caches,
+timelines) run as for an ORM write. pre_save/pre_delete are not sent.
+"""
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+
+def _column(model, name):
+    return connection.ops.quote_name(model._meta.get_field(name).column)
+
+
+def add(model, target, **values):
+    """
+    Insert a `model` row with `values` unless it already exists or the row
+    `values[target]` points at does not. Returns the new instance or None.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    related = model._meta.get_field(target).related_model._meta
+    names = [*values, 'created_at']
+    now = timezone.now()
+    params = [*values.values(), connection.ops.adapt_datetimefield_value(now), values[target]]
+    sql = (
+        f"INSERT INTO {table} ({', '.join(_column(model, name) for name in names)}) "
+        f"SELECT {', '.join(['%s'] * len(names))} "
+        f"FROM {connection.ops.quote_name(related.db_table)} "
+        f"WHERE {connection.ops.quote_name(related.pk.column)} = %s "
+        f"ON CONFLICT DO NOTHING RETURNING {_column(model, model._meta.pk.name)}"
+    )
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        instance = model(pk=row[0], created_at=now, **values)
+        instance._state.adding = False
+        instance._state.db = connection.alias
+        post_save.send(
+            sender=model, instance=instance, created=True, update_fields=None, raw=False, using=connection.alias,
+        )
+    return instance
+
+
+def remove(model, **values):
+    """Delete the `model` row matching `values`. Returns whether there was one."""
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = list(values)
+    sql = (
+        f"DELETE FROM {table} "
+        f"WHERE {' AND '.join(f'{_column(model, name)} = %s' for name in names)} "
+        f"RETURNING {_column(model, model._meta.pk.name)}"
+    )
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, list(values.values()))
+            row = cursor.fetchone()
+        if row is None:
+            return False
+        instance = model(pk=row[0], **values)
+        instance._state.adding = False
+        instance._state.db = connection.alias
+        post_delete.send(sender=model, instance=instance, using=connection.alias, origin=instance)
+    return True
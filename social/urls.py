@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     # Follow
+    path('users/relationship-status/', views.RelationshipStatusView.as_view(), name='relationship-status'),
     path('users/<int:user_id>/follow/', views.FollowUserView.as_view()),
     path('users/<int:user_id>/unfollow/', views.UnfollowUserView.as_view()),
     path('users/<int:user_id>/followers/', views.UserFollowersView.as_view()),
@@ -11,6 +12,7 @@ urlpatterns = [
     # Likes
     path('posts/<int:post_id>/like/', views.LikePostView.as_view(), name='like-post'),
     path('posts/<int:post_id>/unlike/', views.UnlikePostView.as_view(), name='unlike-post'),
+    path('posts/like-status/', views.BatchLikeStatusView.as_view(), name='batch-like-status'),
     path('posts/<int:post_id>/like-status/', views.LikeStatusView.as_view(), name='like-status'),
 
     # Comments
@@ -23,6 +25,8 @@ urlpatterns = [
 
     # Notifications
     path('notifications/', views.get_notifications, name='get_notifications'),
+    path('notifications/unread-count/', views.get_unread_count, name='get_unread_count'),
+    path('notifications/stream-ticket/', views.get_stream_ticket, name='get_stream_ticket'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_as_read, name='mark_notification_as_read'),
     path('notifications/mark-all-read/', views.mark_all_notifications_as_read, name='mark_all_notifications_as_read'),
 ]
\ No newline at end of file
@@ -7,7 +7,6 @@ from .models import Follow, Like, Comment
 from .serializers import FollowSerializer, FollowerListSerializer, LikeSerializer, CommentSerializer
 from posts.models import Post
 from django.core.paginator import Paginator
-from django.db.models import Count, Exists, OuterRef
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -18,10 +17,32 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import Notification
 from .serializers import NotificationSerializer
+from .timeline import HomeTimeline
+from . import feed_cache, follow_cache, notifications, pubsub, streaming, toggles
+from accounts.authentication import user_states
+from posts.pagination import KeysetPagination, encode_cursor, decode_cursor
+from accounts.avatars import small_avatar
+from rest_framework.exceptions import ValidationError
+from django.http import Http404
 
 
 User = get_user_model()
 
+# most IDs a batch status request may ask about, about one screenful
+MAX_STATUS_IDS = 100
+
+
+def _status_ids(request):
+    """IDs from ?ids=1,2,3 (or repeated ?ids=), deduplicated in order."""
+    raw = ','.join(request.query_params.getlist('ids'))
+    try:
+        ids = list(dict.fromkeys(int(value) for value in raw.split(',') if value.strip()))
+    except ValueError:
+        raise ValidationError({'ids': 'Expected a comma-separated list of integer IDs.'})
+    if len(ids) > MAX_STATUS_IDS:
+        raise ValidationError({'ids': f'At most {MAX_STATUS_IDS} IDs per request.'})
+    return ids
+
 
 # ---------- FOLLOW SYSTEM ----------
 class FollowUserView(generics.CreateAPIView):
@@ -29,22 +50,23 @@ class FollowUserView(generics.CreateAPIView):
     serializer_class = FollowSerializer
 
     def post(self, request, user_id):
-        following = get_object_or_404(User, id=user_id)
-        if Follow.objects.filter(follower=request.user, following=following).exists():
+        if toggles.add(Follow, 'following_id', follower_id=request.user.id, following_id=user_id) is None:
+            # only failures pay for telling the two cases apart
+            if not User.objects.filter(id=user_id).exists():
+                raise Http404('No User matches the given query.')
             return Response({"detail": "Already following"}, status=status.HTTP_400_BAD_REQUEST)
-        Follow.objects.create(follower=request.user, following=following)
-        return Response({"detail": f"You are now following {following.username}"})
+        # usually a cached row: the user was just looked up by the insert
+        state = user_states.get(user_id)
+        username = state.row['username'] if state else user_id
+        return Response({"detail": f"You are now following {username}"})
 
 
 class UnfollowUserView(generics.DestroyAPIView):
     permission_classes = [IsAuthenticated]
 
     def delete(self, request, user_id):
-        following = get_object_or_404(User, id=user_id)
-        follow_instance = Follow.objects.filter(follower=request.user, following=following)
-        if not follow_instance.exists():
+        if not toggles.remove(Follow, follower_id=request.user.id, following_id=user_id):
             return Response({"detail": "You are not following this user"}, status=status.HTTP_400_BAD_REQUEST)
-        follow_instance.delete()
         return Response({"detail": "Unfollowed successfully"})
 
 
@@ -64,15 +86,38 @@ class UserFollowingView(generics.ListAPIView):
         return User.objects.filter(followers_set__follower=user)
 
 
+class RelationshipStatusView(generics.GenericAPIView):
+    """
+    GET /api/social/users/relationship-status/?ids=1,2,3
+    Following / followed-by flags for each user, for rendering a list of people.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        ids = _status_ids(request)
+        following = follow_cache.following_ids(request.user.id)
+        followed_by = set(
+            Follow.objects.filter(following=request.user, follower_id__in=ids)
+            .values_list('follower_id', flat=True)
+        ) if ids else set()
+        return Response({
+            str(user_id): {
+                'following': follow_cache.is_following(request.user.id, user_id, following),
+                'followed_by': user_id in followed_by,
+            }
+            for user_id in ids
+        })
+
+
 # ---------- LIKE SYSTEM ----------
 class LikePostView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request, post_id):
-        post = get_object_or_404(Post, id=post_id)
-        if Like.objects.filter(user=request.user, post=post).exists():
+        if toggles.add(Like, 'post_id', user_id=request.user.id, post_id=post_id) is None:
+            if not Post.objects.filter(id=post_id).exists():
+                raise Http404('No Post matches the given query.')
             return Response({'detail': 'Already liked'}, status=status.HTTP_400_BAD_REQUEST)
-        Like.objects.create(user=request.user, post=post)
         return Response({'detail': 'Post liked'})
 
 
@@ -80,9 +125,8 @@ class UnlikePostView(generics.DestroyAPIView):
     permission_classes = [IsAuthenticated]
     
     def delete(self, request, post_id):
-        post = get_object_or_404(Post, id=post_id)
-        like = get_object_or_404(Like, user=request.user, post=post)
-        like.delete()
+        if not toggles.remove(Like, user_id=request.user.id, post_id=post_id):
+            raise Http404('No Like matches the given query.')
         return Response({'detail': 'Post unliked'})
 
 
@@ -95,6 +139,19 @@ class LikeStatusView(generics.RetrieveAPIView):
         return Response({"liked": liked})
 
 
+class BatchLikeStatusView(generics.GenericAPIView):
+    """
+    GET /api/social/posts/like-status/?ids=1,2,3
+    Liked flags for a screenful of posts; unknown IDs are reported as not liked.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        ids = _status_ids(request)
+        liked = feed_cache.liked_ids(request.user.id, ids) if ids else set()
+        return Response({str(post_id): post_id in liked for post_id in ids})
+
+
 # ---------- COMMENT SYSTEM ----------
 class AddCommentView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
@@ -105,12 +162,18 @@ class AddCommentView(generics.CreateAPIView):
         serializer.save(author=self.request.user, post=post)
 
 
+class CommentPagination(KeysetPagination):
+    # oldest first, so a thread reads top to bottom
+    descending = False
+
+
 class GetCommentsView(generics.ListAPIView):
     serializer_class = CommentSerializer
+    pagination_class = CommentPagination
 
     def get_queryset(self):
         post = get_object_or_404(Post, id=self.kwargs['post_id'])
-        return Comment.objects.filter(post=post, is_active=True)
+        return Comment.objects.filter(post=post, is_active=True).order_by('created_at', 'id')
 
 
 class DeleteOwnCommentView(generics.DestroyAPIView):
@@ -123,6 +186,9 @@ class DeleteOwnCommentView(generics.DestroyAPIView):
 
 
 
+FEED_PAGE_SIZE = 20
+
+
 # social/views.py
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -131,24 +197,47 @@ def feed(request):
     Returns the chronological feed of posts from followed users
     """
     user = request.user
-    
-    # Get IDs of followed users
-    following_ids = Follow.objects.filter(follower=user).values_list('following_id', flat=True)
-    
-    # Get posts from followed users
-    posts_qs = Post.objects.filter(
-        author_id__in=list(following_ids),
-        is_active=True
-    ).annotate(
-        like_count_actual=Count('likes', distinct=True),
-        comment_count_actual=Count('comments', distinct=True),
-        is_liked=Exists(Like.objects.filter(post=OuterRef('pk'), user=user))
-    ).order_by('-created_at')
-    
-    # Pagination
-    page_number = request.GET.get('page', 1)
-    paginator = Paginator(posts_qs, 20)
-    page_obj = paginator.get_page(page_number)
+
+    # Keyset mode: ?cursor= (empty for the first page) skips the COUNT and OFFSET
+    if 'cursor' in request.GET:
+        page_key = f"cursor:{request.GET.get('cursor')}"
+    else:
+        page_key = f"page:{request.GET.get('page', 1)}"
+
+    # The first few pages are served from the feed cache; is_liked is per request
+    pages = feed_cache.FeedPageCache(user.id)
+    payload = pages.get(page_key)
+    if payload is None:
+        posts_qs = HomeTimeline(user)
+        versions = feed_cache.author_versions(
+            set(follow_cache.following_ids(user.id)).union(posts_qs.pull_ids)
+        )
+        payload = build_feed_page(user, request.GET, posts_qs)
+        authors = {item['author']['id'] for item in payload['results']}
+        pages.set(page_key, payload, authors.union(posts_qs.pull_ids), versions)
+
+    liked = feed_cache.liked_ids(user.id, [item['id'] for item in payload['results']])
+    results = [dict(item, is_liked=item['id'] in liked) for item in payload['results']]
+    return Response(dict(payload, results=results))
+
+
+def build_feed_page(user, params, posts_qs=None):
+    """One feed page without is_liked, ready to cache."""
+    # Materialized timeline merged with any high-follower authors we pull
+    if posts_qs is None:
+        posts_qs = HomeTimeline(user)
+
+    keyset_mode = 'cursor' in params
+    if keyset_mode:
+        position = decode_cursor(params.get('cursor'))
+        keys = posts_qs.keys(FEED_PAGE_SIZE + 1, after=position)
+        has_next = len(keys) > FEED_PAGE_SIZE
+        keys = keys[:FEED_PAGE_SIZE]
+        page_obj = posts_qs.load(keys)
+    else:
+        page_number = params.get('page', 1)
+        paginator = Paginator(posts_qs, FEED_PAGE_SIZE)
+        page_obj = paginator.get_page(page_number)
     
     # Serialize response
     feed_data = []
@@ -157,6 +246,8 @@ def feed(request):
             "id": post.id,
             "content": post.content,
             "image_url": post.image_url,
+            "image_variants": post.image_variants,
+            "image_status": post.image_status,
             "category": post.category,
             "created_at": post.created_at.isoformat(),
             "author": {
@@ -164,42 +255,74 @@ def feed(request):
                 "username": post.author.username,
                 "first_name": post.author.first_name,
                 "last_name": post.author.last_name,
+                "avatar_url": small_avatar(getattr(post.author, 'profile', None)),
             },
             "like_count": post.like_count_actual,
             "comment_count": post.comment_count_actual,
-            "is_liked": post.is_liked,
         })
 
-    return Response({
+    if keyset_mode:
+        return {
+            "next_cursor": encode_cursor(*keys[-1]) if has_next else None,
+            "has_next": has_next,
+            "results": feed_data
+        }
+
+    return {
         "page": page_obj.number,
         "total_pages": paginator.num_pages,
         "has_next": page_obj.has_next(),
         "has_previous": page_obj.has_previous(),
         "results": feed_data
-    })
+    }
+
+
 
+class NotificationPagination(KeysetPagination):
+    keyset_only = True
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_notifications(request):
-    notifications = Notification.objects.filter(recipient=request.user)
-    serializer = NotificationSerializer(notifications, many=True)
-    return Response(serializer.data)
+    """
+    Cursor-paginated inbox, newest first. ?unread=1 limits it to unread rows.
+    """
+    inbox = Notification.objects.filter(recipient=request.user).select_related('sender', 'recipient')
+    if request.GET.get('unread') in ('1', 'true'):
+        inbox = inbox.filter(is_read=False)
+    paginator = NotificationPagination()
+    page = paginator.paginate_queryset(inbox, request)
+    serializer = NotificationSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_unread_count(request):
+    return Response({"unread_count": notifications.unread_count(request.user.id)})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def get_stream_ticket(request):
+    """Single-use ticket for opening the notification stream (social/streaming.py)."""
+    return Response({"ticket": streaming.issue_ticket(request.user.id), "expires_in": streaming.ticket_ttl()})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_notification_as_read(request, notification_id):
-    try:
-        notification = Notification.objects.get(id=notification_id, recipient=request.user)
-        notification.is_read = True
-        notification.save()
-        return Response({"message": "Notification marked as read"})
-    except Notification.DoesNotExist:
+    updated = Notification.objects.filter(
+        id=notification_id, recipient=request.user, is_read=False
+    ).update(is_read=True)
+    if updated:
+        notifications.adjust_unread_count(request.user.id, -1)
+        pubsub.publish(request.user.id, ('unread_count', {'delta': -1}))
+    elif not Notification.objects.filter(id=notification_id, recipient=request.user).exists():
         return Response({"error": "Notification not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"message": "Notification marked as read"})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_all_notifications_as_read(request):
     Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+    notifications.reset_unread_count(request.user.id)
     return Response({"message": "All notifications marked as read"})
\ No newline at end of file
@@ -15,13 +15,13 @@ User = get_user_model()
 
 # 1. List All Users
 class AdminUserListView(generics.ListAPIView):
-    queryset = User.objects.all()
+    queryset = User.objects.all().select_related('profile')
     serializer_class = AdminUserSerializer
     permission_classes = [IsAuthenticated, IsAdminUserCustom]
 
 # 2. Get User Details
 class AdminUserDetailView(generics.RetrieveAPIView):
-    queryset = User.objects.all()
+    queryset = User.objects.all().select_related('profile')
     serializer_class = AdminUserSerializer
     permission_classes = [IsAuthenticated, IsAdminUserCustom]
     lookup_url_kwarg = 'user_id'